@@ -1,4 +1,6 @@
 import os
+import sys
+import asyncio
 import logging
 
 from typing import Any, Mapping
@@ -12,6 +14,8 @@ from .app import run_app
 from .cli import args
 from .config import Config
 from .logger import setup as setup_logger
+from .migrator import squash_migrations
+from .utils.populate_db import Options, populate_db
 
 uvloop.install()
 
@@ -23,6 +27,12 @@ if __name__ == "__main__":
 
     log.info(f"running on version {os.environ.get('GIT_COMMIT', 'UNSET')}")
 
+    if args.squash_migrations:
+        # does not need config or database
+        squash_migrations()
+
+        sys.exit(0)
+
     config_format: Mapping[str, Any]
 
     config = Config()
@@ -39,9 +49,20 @@ if __name__ == "__main__":
         log.info("skipping sentry initialization")
 
     if args.populate_db:
-        # from .utils.populate_db import populate_db
-        #
-        # populate_db(config)
-        pass
+        options = Options(
+            users=args.users,
+            teams=args.teams,
+            articles=args.articles,
+            comments=args.comments,
+            thread_depth=args.thread_depth,
+            thread_fanout=args.thread_fanout,
+            seed=args.seed,
+            export_path=args.export_dataset,
+            import_path=args.import_dataset,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+        )
+
+        asyncio.run(populate_db(config, options))
     else:
         run_app(config)
@@ -1,3 +1,4 @@
+import sys
 import logging
 
 from aiohttp import web
@@ -7,7 +8,12 @@ from .tasks import setup as setup_tasks
 from .config import Config
 from .docker import setup as setup_docker
 from .routes import setup as setup_routes
-from .migrator import migrate
+from .handoff import HANDOFF_EXIT_CODE
+from .handoff import setup as setup_handoff
+from .rollout import setup as setup_rollout
+from .startup import setup as setup_startup
+from .executor import setup as setup_executor
+from .migrator import setup as setup_migrator
 from .db.edgedb import setup as setup_edgedb
 
 log = logging.getLogger(__name__)
@@ -35,13 +41,23 @@ async def on_startup(app: web.Application) -> None:
 def init_app(app: web.Application) -> None:
     log.debug("registering routes")
 
+    # other setup functions register startup phases
+    setup_startup(app)
+
     setup_routes(app)
 
+    setup_executor(app)
+    setup_migrator(app)
     setup_docker(app)
     setup_edgedb(app)
 
+    # depends on docker, used by tasks
+    setup_rollout(app)
+
     setup_tasks(app)
 
+    setup_handoff(app)
+
     app.on_startup.append(on_startup)
 
 
@@ -72,8 +88,6 @@ async def stop_app(app: web.Application) -> None:
 
 
 def run_app(config: Config) -> None:
-    migrate(config)
-
     app = web.Application()
 
     app["config"] = config
@@ -91,4 +105,14 @@ def run_app(config: Config) -> None:
         port=app_config["port"],
         access_log_class=AccessLogger,
         # access_log_format="%{X-Forwarded-For}i '%{Referer}i' '%{User-Agent}i' %r %s %Tf",
+        # lets next instance listen on the same port during handoff
+        reuse_port=app_config["handoff"],
     )
+
+    if app["startup"].failed:
+        sys.exit(1)
+
+    if app["handed_off"].is_set():
+        log.info("handed off to new instance, exiting")
+
+        sys.exit(HANDOFF_EXIT_CODE)
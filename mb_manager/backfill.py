@@ -0,0 +1,159 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import importlib.util
+
+from typing import Any, List, Callable, Optional, Sequence, Awaitable
+
+import edgedb
+
+from .db import backfills
+
+log = logging.getLogger(__name__)
+
+BACKFILLS_FOLDER = "edgedb/backfills"
+
+_BatchFn = Callable[[Any, uuid.UUID, int], Awaitable[Sequence[uuid.UUID]]]
+_FenceFn = Callable[[Any], Awaitable[None]]
+
+
+class BackfillError(Exception):
+    pass
+
+
+class Backfill:
+    """
+    Data migration that runs in small batches, each in its own transaction.
+
+    Batch receives connection, cursor and limit. It processes at most limit objects
+    with id greater than cursor in id order and returns their ids. Latest id is saved
+    as cursor in the same transaction, so backfill resumes after crash without
+    skipping or repeating batches. Backfill finishes when batch is not full.
+
+    EdgeQL backfill is a single query with $cursor and $limit arguments, for example:
+
+        SELECT (
+            UPDATE (
+                SELECT User FILTER .id > <uuid>$cursor ORDER BY .id LIMIT <int64>$limit
+            )
+            SET { email_verified := true }
+        ).id
+
+    Python backfill module defines async run_batch(conn, cursor, limit) function.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.name, extension = os.path.splitext(filename)
+
+        left_part, _, _ = filename.partition("_")
+
+        try:
+            self.version = int(left_part)
+        except ValueError:
+            raise BackfillError(f"Bad version format in filename: {left_part}")
+
+        path = f"{BACKFILLS_FOLDER}/{filename}"
+
+        if extension == ".edgeql":
+            with open(path) as f:
+                self._batch = self._make_edgeql_batch(f.read())
+        elif extension == ".py":
+            self._batch = self._load_python_batch(path)
+        else:
+            raise BackfillError(f"Unknown backfill type: {filename}")
+
+    @staticmethod
+    def _make_edgeql_batch(query: str) -> _BatchFn:
+        async def run_batch(
+            conn: Any, cursor: uuid.UUID, limit: int
+        ) -> Sequence[uuid.UUID]:
+            ids: Sequence[uuid.UUID] = await conn.fetchall(
+                query, cursor=cursor, limit=limit
+            )
+
+            return ids
+
+        return run_batch
+
+    def _load_python_batch(self, path: str) -> _BatchFn:
+        spec = importlib.util.spec_from_file_location(f"{__name__}.{self.name}", path)
+        assert spec is not None and spec.loader is not None
+
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        if not hasattr(module, "run_batch"):
+            raise BackfillError(f"{path} does not define run_batch")
+
+        run_batch: _BatchFn = module.run_batch
+
+        return run_batch
+
+    async def run(
+        self,
+        pool: edgedb.AsyncIOPool,
+        cursor: uuid.UUID,
+        batch_size: int,
+        rows_per_second: float,
+        fence: Optional[_FenceFn] = None,
+    ) -> None:
+        """
+        Run batches from cursor until finished. Zero rows_per_second is unlimited.
+
+        Fence is called with connection in every batch transaction before batch, it
+        raises to roll batch back.
+        """
+
+        total = 0
+        started_at = time.monotonic()
+
+        while True:
+            batch_started_at = time.monotonic()
+
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    if fence is not None:
+                        await fence(conn)
+
+                    ids = await self._batch(conn, cursor, batch_size)
+
+                    # ids are not guaranteed to be returned in order
+                    if ids:
+                        cursor = max(ids)
+
+                    finished = len(ids) < batch_size
+
+                    await backfills.advance(conn, self.name, cursor, len(ids), finished)
+
+            total += len(ids)
+
+            if finished:
+                break
+
+            log.debug(f"backfill {self.name}: {total} rows, cursor {cursor}")
+
+            if rows_per_second:
+                elapsed = time.monotonic() - batch_started_at
+
+                await asyncio.sleep(max(0, len(ids) / rows_per_second - elapsed))
+
+        log.info(
+            f"finished backfill {self.name}: {total} rows in "
+            f"{time.monotonic() - started_at:.1f}s"
+        )
+
+
+def load_backfills() -> List[Backfill]:
+    if not os.path.exists(BACKFILLS_FOLDER):
+        return []
+
+    return sorted(
+        (
+            Backfill(filename)
+            for filename in os.listdir(BACKFILLS_FOLDER)
+            if not filename.startswith((".", "_"))
+        ),
+        key=lambda b: b.version,
+    )
@@ -1,5 +1,16 @@
 import argparse
 
+from .utils.populate_db import (
+    TOTAL_TEAMS,
+    TOTAL_USERS,
+    THREAD_DEPTH,
+    THREAD_FANOUT,
+    TOTAL_ARTICLES,
+    TOTAL_COMMENTS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+)
+
 argparser = argparse.ArgumentParser(
     prog="mb_manager", description="ModBay manager instance"
 )
@@ -15,5 +26,62 @@ argparser.add_argument(
     action="store_true",
     help="Populate database with sample data and exit",
 )
+for name, default in (
+    ("users", TOTAL_USERS),
+    ("teams", TOTAL_TEAMS),
+    ("articles", TOTAL_ARTICLES),
+    ("comments", TOTAL_COMMENTS),
+):
+    argparser.add_argument(
+        f"--{name}",
+        type=int,
+        default=default,
+        help=f"Number of {name} generated when populating database",
+    )
+argparser.add_argument(
+    "--thread-depth",
+    type=int,
+    default=THREAD_DEPTH,
+    help="Deepest comment reply level when populating database",
+)
+argparser.add_argument(
+    "--thread-fanout",
+    type=float,
+    default=THREAD_FANOUT,
+    help="Mean number of replies to every comment when populating database",
+)
+argparser.add_argument(
+    "--seed",
+    type=int,
+    help="Seed of generated data when populating database, random if not set",
+)
+dataset_group = argparser.add_mutually_exclusive_group()
+dataset_group.add_argument(
+    "--export-dataset",
+    metavar="PATH",
+    help="Write generated data into dataset file instead of database and exit",
+)
+dataset_group.add_argument(
+    "--import-dataset",
+    metavar="PATH",
+    help="Populate database with dataset file instead of generated data",
+)
+argparser.add_argument(
+    "--batch-size",
+    type=int,
+    default=DEFAULT_BATCH_SIZE,
+    help="Rows inserted by single query when populating database",
+)
+argparser.add_argument(
+    "--concurrency",
+    type=int,
+    default=DEFAULT_CONCURRENCY,
+    help="Database connections used when populating database",
+)
+argparser.add_argument(
+    "--squash-migrations",
+    action="store_true",
+    help="Squash migrations into snapshot for fresh databases and exit",
+)
 
 args = argparser.parse_args()
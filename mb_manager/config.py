@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import os
 import sys
+import copy
 import logging
+import ipaddress
 
 from typing import Any, Dict
 
@@ -13,8 +15,29 @@ log = logging.getLogger(__name__)
 DEFAULT_FILENAME = "config.yaml"
 
 CONFIG_FORMAT = {
-    "manager": {"host": str, "port": int},
-    "supervisor": {"healthcheck_url": str, "worker_container_name": str},
+    "manager": {"host": str, "port": int, "handoff": bool},
+    "supervisor": {
+        "healthcheck_url": str,
+        "worker_container_name": str,
+        "probe": {
+            "urls": list,
+            "concurrency": int,
+            "timeout": float,
+            "latency_slo": float,
+            "floor": float,
+            "ceiling": float,
+            "multiplier": float,
+            "jitter": float,
+        },
+        "rollout": {
+            "blue_green": bool,
+            "host": str,
+            "state_file": str,
+            "port": int,
+            "blue_port": int,
+            "green_port": int,
+        },
+    },
     "docker": {
         "socket": str,
         "registry": {
@@ -32,6 +55,40 @@ CONFIG_FORMAT = {
     },
     "sentry": {"enabled": bool, "debug": bool, "dsn": str},
     "webhooks": {"gitlab": {"secret": str}},
+    "deploy": {"debounce": float},
+    "leader": {"enabled": bool, "ttl": float},
+    "executor": {"threads": int, "processes": int},
+    "backfill": {"interval": float, "batch_size": int, "rows_per_second": float},
+}
+
+# Keys added after first release. They are filled in when missing so older config
+# files keep working, example config documents them.
+CONFIG_DEFAULTS = {
+    "manager": {"handoff": False},
+    "supervisor": {
+        "probe": {
+            "urls": [],
+            "concurrency": 4,
+            "timeout": 5,
+            "latency_slo": 1,
+            "floor": 2,
+            "ceiling": 60,
+            "multiplier": 2,
+            "jitter": 1,
+        },
+        "rollout": {
+            "blue_green": False,
+            "host": "127.0.0.1",
+            "state_file": "state/worker_slot",
+            "port": 8080,
+            "blue_port": 8090,
+            "green_port": 8091,
+        },
+    },
+    "deploy": {"debounce": 10},
+    "leader": {"enabled": False, "ttl": 15},
+    "executor": {"threads": 4, "processes": 2},
+    "backfill": {"interval": 60, "batch_size": 500, "rows_per_second": 2000},
 }
 
 ENV_PREFIX = "MODBAY_"
@@ -39,6 +96,16 @@ ENV_PREFIX = "MODBAY_"
 _EMPTY = object()
 
 
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
 class EnvTag:
     yaml_tag = "!env"
 
@@ -77,9 +144,51 @@ class Config:
     def validate(config: Any) -> Any:
         """Validate config."""
 
+        Config._fill_defaults(config, CONFIG_DEFAULTS)
         Config._detect_missing(config, CONFIG_FORMAT)
 
-        return Config._validate(config, CONFIG_FORMAT)
+        validated = Config._validate(config, CONFIG_FORMAT)
+
+        Config._check_options(validated)
+
+        return validated
+
+    @staticmethod
+    def _check_options(cfg: Any) -> None:
+        """Reject option combinations that are unsafe."""
+
+        manager_config = cfg["manager"]
+
+        # handoff uses host network, other addresses expose manager on every interface
+        if manager_config["handoff"] and not _is_loopback(manager_config["host"]):
+            log.fatal("manager.handoff requires manager.host to be loopback address")
+
+            sys.exit(1)
+
+        # worker traffic goes through manager proxy, restart would drop connections
+        if cfg["supervisor"]["rollout"]["blue_green"] and not manager_config["handoff"]:
+            log.fatal("supervisor.rollout.blue_green requires manager.handoff")
+
+            sys.exit(1)
+
+    @staticmethod
+    def _fill_defaults(cfg: Any, defaults: Any, *path: str) -> None:
+        """Add missing keys that have default values."""
+
+        for name, default in defaults.items():
+            if isinstance(default, dict):
+                # entire node is missing
+                if cfg.get(name) is None:
+                    cfg[name] = {}
+
+                Config._fill_defaults(cfg[name], default, *path, name)
+            elif name not in cfg:
+                log.info(
+                    f"{'.'.join([*path, name])} key is missing from config, "
+                    f"using default: {default}"
+                )
+
+                cfg[name] = copy.deepcopy(default)
 
     @staticmethod
     def _detect_missing(cfg: Any, fmt: Any, *path: str) -> Any:
@@ -0,0 +1,61 @@
+import uuid
+import logging
+
+from typing import Any, Dict
+
+import edgedb
+
+log = logging.getLogger(__name__)
+
+# cursor of backfill that did not process anything yet, smaller than any other uuid
+NIL_CURSOR = uuid.UUID(int=0)
+
+
+async def fetch_all(pool: edgedb.AsyncIOPool) -> Dict[str, Any]:
+    """Return progress of all started backfills by name."""
+
+    backfills = await pool.fetchall("SELECT Backfill { name, cursor, rows, finished }")
+
+    return {backfill.name: backfill for backfill in backfills}
+
+
+async def create(pool: edgedb.AsyncIOPool, name: str) -> None:
+    await pool.fetchall(
+        """
+        INSERT Backfill {
+            name := <str>$name,
+            cursor := <uuid>$cursor,
+            rows := 0,
+        }
+        """,
+        name=name,
+        cursor=NIL_CURSOR,
+    )
+
+    log.info(f"created backfill {name}")
+
+
+async def advance(
+    conn: edgedb.AsyncIOConnection,
+    name: str,
+    cursor: uuid.UUID,
+    rows: int,
+    finished: bool,
+) -> None:
+    """Save progress. Must be called in batch transaction to resume exactly after it."""
+
+    await conn.fetchall(
+        """
+        UPDATE Backfill
+        FILTER .name = <str>$name
+        SET {
+            cursor := <uuid>$cursor,
+            rows := .rows + <int64>$rows,
+            finished := <bool>$finished,
+        }
+        """,
+        name=name,
+        cursor=cursor,
+        rows=rows,
+        finished=finished,
+    )
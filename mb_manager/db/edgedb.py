@@ -19,12 +19,15 @@ async def _disconnect(app: web.Application) -> None:
     log.debug("disconnecting from edgedb")
 
     app["edgedb_ready"].clear()
-    await app["edgedb"].aclose()
+
+    # startup could be interrupted
+    if "edgedb" in app:
+        await app["edgedb"].aclose()
 
 
 def setup(app: web.Application) -> None:
     # useless without reconnect logic
     app["edgedb_ready"] = asyncio.Event()
 
-    app.on_startup.append(_connect)
+    app["startup"].add("edgedb", _connect)
     app.on_cleanup.append(_disconnect)
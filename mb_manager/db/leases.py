@@ -0,0 +1,119 @@
+import logging
+
+from typing import Optional
+from datetime import timedelta
+
+import edgedb
+
+log = logging.getLogger(__name__)
+
+
+class LeaseLost(Exception):
+    pass
+
+
+async def acquire(
+    pool: edgedb.AsyncIOPool, name: str, holder: str, ttl: float
+) -> Optional[int]:
+    """
+    Acquire or renew lease. Returns fencing token or None if lease is held by other
+    holder.
+
+    Expiration is checked against database clock, so holders do not need synchronized
+    clocks.
+    """
+
+    duration = timedelta(seconds=ttl)
+
+    leases = await pool.fetchall(
+        """
+        SELECT (
+            UPDATE Lease
+            FILTER .name = <str>$name AND (
+                .holder = <str>$holder OR .expires_at < datetime_current()
+            )
+            SET {
+                token := .token + (0 IF .holder = <str>$holder ELSE 1),
+                holder := <str>$holder,
+                expires_at := datetime_current() + <duration>$ttl,
+            }
+        ) { token }
+        """,
+        name=name,
+        holder=holder,
+        ttl=duration,
+    )
+    if leases:
+        token: int = leases[0].token
+
+        return token
+
+    try:
+        lease = await pool.fetchone(
+            """
+            SELECT (
+                INSERT Lease {
+                    name := <str>$name,
+                    holder := <str>$holder,
+                    token := 1,
+                    expires_at := datetime_current() + <duration>$ttl,
+                }
+            ) { token }
+            """,
+            name=name,
+            holder=holder,
+            ttl=duration,
+        )
+    except edgedb.ConstraintViolationError:
+        # lease exists and is held by someone else
+        return None
+
+    log.info(f"created lease {name}")
+
+    token = lease.token
+
+    return token
+
+
+async def release(pool: edgedb.AsyncIOPool, name: str, holder: str) -> None:
+    """Expire lease immediately if it is held by holder."""
+
+    await pool.fetchall(
+        """
+        UPDATE Lease
+        FILTER .name = <str>$name AND .holder = <str>$holder
+        SET {
+            expires_at := datetime_current(),
+        }
+        """,
+        name=name,
+        holder=holder,
+    )
+
+
+async def check(
+    conn: edgedb.AsyncIOConnection, name: str, holder: str, token: int
+) -> None:
+    """
+    Raise LeaseLost unless holder still holds lease with fencing token.
+
+    Called in transaction of guarded write, write is rolled back if lease changed
+    hands before it commits.
+    """
+
+    held = await conn.fetchone(
+        """
+        SELECT EXISTS (
+            SELECT Lease
+            FILTER .name = <str>$name
+                AND .holder = <str>$holder
+                AND .token = <int64>$token
+                AND .expires_at > datetime_current()
+        )
+        """,
+        name=name,
+        holder=holder,
+        token=token,
+    )
+    if not held:
+        raise LeaseLost(f"lease {name} with token {token} is not held by {holder}")
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+
+from typing import Any, Dict, List, Callable, Iterator, Optional, Awaitable
+from contextlib import contextmanager
+from collections import deque
+from dataclasses import field, dataclass
+
+log = logging.getLogger(__name__)
+
+HISTORY_SIZE = 50
+
+
+@dataclass
+class DeployStage:
+    name: str
+    started_at: float
+    duration: Optional[float] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(name=self.name, started_at=self.started_at, duration=self.duration)
+
+
+@dataclass
+class Deploy:
+    """Single deploy record. Timestamps are unix time, durations are in seconds."""
+
+    target: str
+    pipeline_id: int
+    started_at: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    status: str = "running"
+    error: Optional[str] = None
+    stages: List[DeployStage] = field(default_factory=list)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[DeployStage]:
+        stage = DeployStage(name=name, started_at=time.time())
+        self.stages.append(stage)
+
+        log.debug(f"{self.target}: deploy stage {name} started")
+
+        start = time.monotonic()
+        try:
+            yield stage
+        finally:
+            stage.duration = time.monotonic() - start
+
+            log.debug(f"{self.target}: deploy stage {name} took {stage.duration:.3f}s")
+
+    def skip(self) -> None:
+        self.status = "skipped"
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(
+            target=self.target,
+            pipeline_id=self.pipeline_id,
+            started_at=self.started_at,
+            duration=self.duration,
+            status=self.status,
+            error=self.error,
+            stages=[s.to_json() for s in self.stages],
+        )
+
+
+class DeployRegistry:
+    """Keeps running deploys and bounded history of finished ones."""
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self._running: Dict[str, Deploy] = {}
+        self._history: deque[Deploy] = deque(maxlen=history_size)
+
+    @contextmanager
+    def track(self, target: str, pipeline_id: int) -> Iterator[Deploy]:
+        deploy = Deploy(target=target, pipeline_id=pipeline_id)
+        self._running[target] = deploy
+
+        start = time.monotonic()
+        try:
+            yield deploy
+        except asyncio.CancelledError:
+            deploy.status = "cancelled"
+
+            raise
+        except Exception as e:
+            deploy.status = "failed"
+            deploy.error = repr(e)
+
+            raise
+        else:
+            if deploy.status == "running":
+                deploy.status = "success"
+        finally:
+            deploy.duration = time.monotonic() - start
+
+            del self._running[target]
+            self._history.append(deploy)
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(
+            running=[d.to_json() for d in self._running.values()],
+            # newest first
+            history=[d.to_json() for d in reversed(self._history)],
+        )
+
+
+class DeployQueue:
+    """
+    Debounced latest-wins deploy queue of single target.
+
+    Submissions are collected until no new ones arrive for debounce seconds, then only
+    the newest one is deployed. At most one deploy runs at a time, submissions made
+    during deploy are deployed after it finishes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deploy: Callable[[Any, Deploy], Awaitable[None]],
+        debounce: float,
+        registry: DeployRegistry,
+    ):
+        self.name = name
+        self._deploy = deploy
+        self._debounce = debounce
+        self._registry = registry
+
+        self._pending: Optional[Any] = None
+        self._pending_id = -1
+        self._submitted_at = 0.0
+
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def submit(self, pipeline_id: int, payload: Any) -> None:
+        # hooks can arrive out of order, older pipeline should never win
+        if pipeline_id < self._pending_id:
+            log.info(
+                f"{self.name}: ignoring pipeline {pipeline_id}, "
+                f"{self._pending_id} is newer"
+            )
+
+            return
+
+        if self._pending is not None:
+            log.info(f"{self.name}: pipeline {pipeline_id} replaces {self._pending_id}")
+
+        self._pending = payload
+        self._pending_id = pipeline_id
+        self._submitted_at = asyncio.get_event_loop().time()
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+
+        try:
+            while self._pending is not None:
+                # sleep until debounce window passes without new submissions
+                delay = self._submitted_at + self._debounce - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                    continue
+
+                payload, self._pending = self._pending, None
+
+                log.info(f"{self.name}: deploying pipeline {self._pending_id}")
+                try:
+                    with self._registry.track(self.name, self._pending_id) as deploy:
+                        await self._deploy(payload, deploy)
+                except Exception:
+                    log.exception(f"{self.name}: error deploying")
+        finally:
+            self._task = None
+
+    async def cancel(self) -> None:
+        task = self._task
+        # deploy can stop app itself
+        if task is None or task is asyncio.current_task():
+            return
+
+        task.cancel()
+
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
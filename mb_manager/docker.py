@@ -5,7 +5,16 @@ import asyncio
 import logging
 
 from base64 import b64encode
-from typing import Any, Mapping, Optional
+from typing import (
+    Any,
+    Dict,
+    Tuple,
+    Mapping,
+    Callable,
+    Optional,
+    Sequence,
+    AsyncIterator,
+)
 
 import aiohttp
 
@@ -36,6 +45,9 @@ class Docker:
 
         self._url_base = f"unix://{DOCKER_API_VERSION}"
 
+        # pulls in progress by (image, tag)
+        self._pulls: Dict[Tuple[str, str], asyncio.Future[None]] = {}
+
     # Looks like gitlab does not support IdentityToken yet
     #
     # async def _registry_authorize(self, credentials: Mapping[str, Any]) -> str:
@@ -67,10 +79,54 @@ class Docker:
     async def _read_response(resp: aiohttp.ClientResponse) -> Any:
         content = await resp.read()
 
-        # Docker HTTP API returns \r\n separated list of json objects in response to
-        # /images/create for some reason
-        # Also last item can be empty (not sure if it always is)
-        return [json.loads(i) for i in content.split(b"\r\n")[:-1]]
+        try:
+            return json.loads(content)
+        except ValueError:
+            # Docker HTTP API returns \r\n separated list of json objects in response
+            # to streaming endpoints like /images/create unless stream=True is used
+            return [json.loads(i) for i in content.splitlines() if i.strip()]
+
+    @staticmethod
+    async def _iter_response(
+        url: str, resp: aiohttp.ClientResponse
+    ) -> AsyncIterator[Any]:
+        """Decode json objects one by one as they arrive without buffering body."""
+
+        async for line in resp.content:
+            line = line.strip()
+            if not line:
+                continue
+
+            decoded = json.loads(line)
+
+            # streaming endpoints report errors inside of successful response
+            if isinstance(decoded, dict) and "error" in decoded:
+                raise DockerException(url, resp.status, decoded["error"])
+
+            yield decoded
+
+    @staticmethod
+    async def _raise_for_status(
+        url: str, resp: aiohttp.ClientResponse, body: Any
+    ) -> None:
+        if resp.status // 100 in (2, 3):
+            return
+
+        decoded = await resp.json()
+        with push_scope() as scope:
+            scope.set_extra("request", body)
+            scope.set_extra("response", decoded)
+
+        raise DockerException(url, resp.status, decoded["message"])
+
+    def _make_headers(self, registry_credentials: Mapping[str, Any]) -> Dict[str, str]:
+        headers = {}
+        if registry_credentials:
+            headers["X-Registry-Auth"] = self._make_registry_auth_header(
+                registry_credentials
+            )
+
+        return headers
 
     async def request(
         self,
@@ -79,27 +135,35 @@ class Docker:
         params: Mapping[str, Any] = {},
         body: Any = None,
         registry_credentials: Mapping[str, Any] = {},
+        stream: bool = False,
         **kwargs: Any,
     ) -> Any:
+        """
+        Make request to docker API.
+
+        With stream=True async iterator of decoded json objects is returned instead of
+        full response. Objects are decoded as soon as they arrive.
+        """
+
+        if stream:
+            return self._stream(
+                method,
+                path,
+                params=params,
+                body=body,
+                registry_credentials=registry_credentials,
+                **kwargs,
+            )
+
         url = f"{self._url_base}{path}"
         log.info("%6s: %s", method, url)
 
-        headers = {}
-        if registry_credentials:
-            headers["X-Registry-Auth"] = self._make_registry_auth_header(
-                registry_credentials
-            )
+        headers = self._make_headers(registry_credentials)
 
         async with self._session.request(
             method, url, params=params, json=body, headers=headers, **kwargs
         ) as resp:
-            if resp.status // 100 not in (2, 3):
-                decoded = await resp.json()
-                with push_scope() as scope:
-                    scope.set_extra("request", body)
-                    scope.set_extra("response", decoded)
-
-                raise DockerException(url, resp.status, decoded["message"])
+            await self._raise_for_status(url, resp, body)
 
             if resp.status == 204:
                 decoded = {}
@@ -113,17 +177,161 @@ class Docker:
 
             return decoded
 
+    async def _stream(
+        self,
+        method: str,
+        path: str,
+        params: Mapping[str, Any],
+        body: Any,
+        registry_credentials: Mapping[str, Any],
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        url = f"{self._url_base}{path}"
+        log.info("%6s: %s (stream)", method, url)
+
+        headers = self._make_headers(registry_credentials)
+
+        async with self._session.request(
+            method, url, params=params, json=body, headers=headers, **kwargs
+        ) as resp:
+            await self._raise_for_status(url, resp, body)
+
+            async for decoded in self._iter_response(url, resp):
+                yield decoded
+
     async def pull(
         self,
         image: str,
         tag: str = "latest",
         registry_credentials: Mapping[str, Any] = {},
+        on_progress: Optional[Callable[[Mapping[str, Any]], None]] = None,
     ) -> None:
-        await self.request(
+        """
+        Pull image from registry.
+
+        Concurrent pulls of same image and tag share single request, all callers get
+        its result or exception. on_progress is only called for caller that started
+        the pull.
+        """
+
+        key = (image, tag)
+
+        pull = self._pulls.get(key)
+        if pull is None:
+            pull = asyncio.ensure_future(
+                self._pull(image, tag, registry_credentials, on_progress)
+            )
+            pull.add_done_callback(lambda f: self._pull_done(key, f))
+
+            self._pulls[key] = pull
+        else:
+            log.info("pull %s:%s is already in progress, waiting", image, tag)
+
+        # cancellation of one caller should not cancel pull for the rest
+        await asyncio.shield(pull)
+
+    def _pull_done(self, key: Tuple[str, str], pull: asyncio.Future[None]) -> None:
+        self._pulls.pop(key, None)
+
+        # mark exception as retrieved in case all callers were cancelled
+        if not pull.cancelled():
+            pull.exception()
+
+    async def _pull(
+        self,
+        image: str,
+        tag: str,
+        registry_credentials: Mapping[str, Any],
+        on_progress: Optional[Callable[[Mapping[str, Any]], None]],
+    ) -> None:
+        statuses = await self.request(
             "POST",
             "/images/create",
             params=dict(fromImage=image, tag=tag,),
             registry_credentials=registry_credentials,
+            stream=True,
+            timeout=None,
+        )
+
+        # progress objects are not stored, error object is raised by stream reader
+        async for status in statuses:
+            log.debug(
+                "pull %s:%s: %s %s",
+                image,
+                tag,
+                status.get("id", ""),
+                status.get("status", ""),
+            )
+
+            if on_progress is not None:
+                on_progress(status)
+
+    async def inspect(self, name: str) -> Any:
+        return await self.request("GET", f"/containers/{name}/json")
+
+    async def inspect_image(self, name: str) -> Any:
+        return await self.request("GET", f"/images/{name}/json")
+
+    async def distribution_digest(
+        self, name: str, registry_credentials: Mapping[str, Any] = {}
+    ) -> str:
+        """Get manifest digest of image in registry without pulling it."""
+
+        distribution = await self.request(
+            "GET",
+            f"/distribution/{name}/json",
+            registry_credentials=registry_credentials,
+        )
+
+        digest: str = distribution["Descriptor"]["digest"]
+
+        return digest
+
+    async def local_digests(self, name: str) -> Sequence[str]:
+        """Get registry digests of local image. Empty if image is missing."""
+
+        try:
+            image = await self.inspect_image(name)
+        except DockerException as e:
+            if e.status != 404:
+                raise
+
+            return ()
+
+        # RepoDigests are in repository@sha256:... format
+        return [d.partition("@")[2] for d in image.get("RepoDigests") or ()]
+
+    async def events(
+        self, filters: Mapping[str, Sequence[str]] = {}, since: Optional[int] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Subscribe to docker events. Stream never ends unless connection breaks.
+
+        since is unix timestamp in nanoseconds, events starting from it are replayed.
+        """
+
+        params = dict(filters=json.dumps(filters))
+        if since is not None:
+            seconds, nanoseconds = divmod(since, 10 ** 9)
+            params["since"] = f"{seconds}.{nanoseconds:09}"
+
+        events: AsyncIterator[Any] = await self.request(
+            "GET", "/events", params=params, stream=True, timeout=None
+        )
+
+        return events
+
+    async def create(self, name: str, body: Mapping[str, Any]) -> Any:
+        return await self.request(
+            "POST", "/containers/create", params=dict(name=name), body=body,
+        )
+
+    async def start(self, name: str) -> None:
+        await self.request("POST", f"/containers/{name}/start")
+
+    async def remove(self, name: str, force: bool = False) -> None:
+        await self.request(
+            "DELETE", f"/containers/{name}", params=dict(force=str(force).lower()),
         )
 
     async def restart(self, name: str) -> None:
@@ -162,12 +370,14 @@ async def _disconnect(app: aiohttp.web.Application) -> None:
 
     app["docker_ready"].clear()
 
-    await app["docker"].close()
+    # startup could be interrupted
+    if "docker" in app:
+        await app["docker"].close()
 
 
 def setup(app: aiohttp.web.Application) -> None:
     # useless without reconnect logic
     app["docker_ready"] = asyncio.Event()
 
-    app.on_startup.append(_connect)
+    app["startup"].add("docker", _connect)
     app.on_cleanup.append(_disconnect)
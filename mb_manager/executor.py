@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import functools
+
+from typing import Any, Set, Dict, TypeVar, Callable, Optional
+from concurrent.futures import Future, Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BlockingExecutor:
+    """
+    Bounded pool for blocking jobs with basic accounting.
+
+    Jobs that did not start yet are cancelled on timeout or cancellation. Running
+    jobs cannot be interrupted, their result is discarded.
+
+    Pool is created on first job, unused process pool does not fork workers.
+    """
+
+    def __init__(self, name: str, make_executor: Callable[[], Executor]):
+        self.name = name
+
+        self._make_executor = make_executor
+        self._executor: Optional[Executor] = None
+        self._futures: Set[Future[Any]] = set()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.timed_out = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for f in self._futures if not f.running())
+
+    @property
+    def running(self) -> int:
+        return sum(1 for f in self._futures if f.running())
+
+    async def run(
+        self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None
+    ) -> T:
+        if self._executor is None:
+            self._executor = self._make_executor()
+
+        future = self._executor.submit(fn, *args)
+
+        self.submitted += 1
+        # only touched from event loop, status handlers iterate it
+        self._futures.add(future)
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            future.cancel()
+
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            future.cancel()
+
+            raise
+        except Exception:
+            self.failed += 1
+
+            raise
+        finally:
+            self._futures.discard(future)
+
+        self.completed += 1
+
+        return result
+
+    def shutdown(self) -> None:
+        for future in set(self._futures):
+            future.cancel()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(
+            queue_depth=self.queue_depth,
+            running=self.running,
+            submitted=self.submitted,
+            completed=self.completed,
+            failed=self.failed,
+            cancelled=self.cancelled,
+            timed_out=self.timed_out,
+        )
+
+
+async def run_blocking(
+    app: web.Application,
+    fn: Callable[..., T],
+    *args: Any,
+    timeout: Optional[float] = None,
+    process: bool = False,
+) -> T:
+    """
+    Run blocking function in thread pool or process pool without stalling event loop.
+
+    Function and arguments must be picklable for process pool.
+    """
+
+    executor: BlockingExecutor = app["executors"]["process" if process else "thread"]
+
+    return await executor.run(fn, *args, timeout=timeout)
+
+
+async def _shutdown(app: web.Application) -> None:
+    for executor in app["executors"].values():
+        executor.shutdown()
+
+
+def setup(app: web.Application) -> None:
+    executor_config = app["config"]["executor"]
+
+    app["executors"] = {
+        "thread": BlockingExecutor(
+            "thread",
+            functools.partial(
+                ThreadPoolExecutor, max_workers=executor_config["threads"]
+            ),
+        ),
+        "process": BlockingExecutor(
+            "process",
+            functools.partial(
+                ProcessPoolExecutor, max_workers=executor_config["processes"]
+            ),
+        ),
+    }
+
+    app.on_cleanup.append(_shutdown)
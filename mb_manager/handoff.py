@@ -0,0 +1,132 @@
+import os
+import uuid
+import signal
+import asyncio
+import logging
+
+from typing import Any, Dict
+
+import aiohttp
+
+from aiohttp import web
+
+from .docker import Docker, DockerException
+
+log = logging.getLogger(__name__)
+
+# tells systemd unit to wait for new container instead of restarting
+HANDOFF_EXIT_CODE = 75
+
+# seconds to wait for new instance readiness
+HANDOFF_TIMEOUT = 60
+READINESS_POLL_INTERVAL = 0.5
+
+# containers alternate between base and suffixed names
+NAME_SUFFIX = ".next"
+
+INSTANCE_ID = os.environ.get("MODBAY_INSTANCE_ID") or uuid.uuid4().hex
+
+
+def _next_name(name: str) -> str:
+    if name.endswith(NAME_SUFFIX):
+        return name[: -len(NAME_SUFFIX)]
+
+    return f"{name}{NAME_SUFFIX}"
+
+
+def _make_create_body(
+    current: Any, image: str, name: str, instance_id: str
+) -> Dict[str, Any]:
+    config = current["Config"]
+    host_config = current["HostConfig"]
+
+    env = [
+        e
+        for e in config.get("Env") or ()
+        if not e.startswith(("MODBAY_INSTANCE_ID=", "MODBAY_CONTAINER_NAME="))
+    ]
+    env.extend((f"MODBAY_INSTANCE_ID={instance_id}", f"MODBAY_CONTAINER_NAME={name}"))
+
+    return {
+        "User": config.get("User", ""),
+        "Cmd": config.get("Cmd"),
+        "Env": env,
+        "Image": image,
+        "HostConfig": {
+            "Binds": host_config.get("Binds"),
+            "NetworkMode": host_config.get("NetworkMode"),
+            "PortBindings": host_config.get("PortBindings"),
+            "AutoRemove": True,
+        },
+    }
+
+
+async def _wait_ready(url: str, instance_id: str) -> None:
+    # new connection for every probe, otherwise keep-alive sticks to old process
+    connector = aiohttp.TCPConnector(force_close=True)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        while True:
+            try:
+                async with session.get(url) as resp:
+                    if resp.status == 200:
+                        ready = await resp.json()
+                        if ready["instance"] == instance_id:
+                            return
+            except aiohttp.ClientError:
+                pass
+
+            await asyncio.sleep(READINESS_POLL_INTERVAL)
+
+
+async def handoff(app: web.Application, image: str, container_name: str) -> None:
+    """
+    Start new manager from image and stop current one after it becomes ready.
+
+    Both instances listen on the same port using SO_REUSEPORT, so listener is never
+    unreachable. This requires manager container to use host network. Systemd unit
+    keeps supervising new container after current one exits with HANDOFF_EXIT_CODE.
+    """
+
+    docker: Docker = app["docker"]
+    manager_config = app["config"]["manager"]
+
+    current = await docker.inspect(container_name)
+
+    new_name = _next_name(container_name)
+    instance_id = uuid.uuid4().hex
+
+    log.info(f"handing off to {new_name}")
+
+    try:
+        await docker.create(
+            new_name, _make_create_body(current, image, new_name, instance_id)
+        )
+        await docker.start(new_name)
+
+        await asyncio.wait_for(
+            _wait_ready(
+                f"http://127.0.0.1:{manager_config['port']}/status/ready", instance_id
+            ),
+            HANDOFF_TIMEOUT,
+        )
+    except (DockerException, asyncio.TimeoutError):
+        log.error(f"handoff to {new_name} failed, removing it")
+
+        try:
+            await docker.remove(new_name, force=True)
+        except DockerException as e:
+            if e.status != 404:
+                log.exception("unable to remove new container")
+
+        raise
+
+    log.info(f"{new_name} is ready, draining")
+
+    app["handed_off"].set()
+
+    # aiohttp handles SIGTERM by closing listener and waiting for running requests
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def setup(app: web.Application) -> None:
+    app["handed_off"] = asyncio.Event()
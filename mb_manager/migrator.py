@@ -1,16 +1,30 @@
+from __future__ import annotations
+
 import os
-import sys
+import asyncio
+import hashlib
 import logging
 
+from typing import List, Tuple, Optional, Sequence
+
 import edgedb
 
 from aiohttp import web
 
-from .config import Config
+from .executor import run_blocking
 
 log = logging.getLogger(__name__)
 
 MIGRATIONS_FOLDER = "edgedb/migrations"
+SCHEMA_FILE = "edgedb/schema.esdl"
+SNAPSHOT_FILE = "edgedb/snapshot.edgeql"
+
+SCHEMA_START = "### SCHEMA MIGRATION START ###"
+SCHEMA_END = "### SCHEMA MIGRATION END ###"
+SNAPSHOT_HEADER = "# SNAPSHOT"
+
+# first version that has DB.checksums property, older databases cannot be verified
+CHECKSUMS_VERSION = 5
 
 
 class MigrationError(Exception):
@@ -21,6 +35,30 @@ def _fmt_db_version(version: int) -> str:
     return "[NEW]" if version == -1 else f"#{version:04}"
 
 
+async def _apply(
+    pool: edgedb.AsyncIOPool, query: str, version: int, checksums: Sequence[str]
+) -> None:
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(query)
+
+            if version < CHECKSUMS_VERSION:
+                await conn.fetchall(
+                    "UPDATE DB SET { schema_version := <int16>$0 }", version
+                )
+            else:
+                await conn.fetchall(
+                    """
+                    UPDATE DB SET {
+                        schema_version := <int16>$0,
+                        checksums := <array<str>>$1
+                    }
+                    """,
+                    version,
+                    list(checksums),
+                )
+
+
 class EdgeDBMigration:
     def __init__(self, filename: str) -> None:
         self._filename = filename
@@ -34,70 +72,244 @@ class EdgeDBMigration:
         except ValueError:
             raise MigrationError(f"Bad version format in filename: {left_part}")
 
-    def run(self, conn: edgedb.BlockingIOConnection) -> None:
-        with open(f"{MIGRATIONS_FOLDER}/{self._filename}") as f:
-            try:
-                with conn.transaction():
-                    conn.execute(f.read())
-                    conn.fetchall(
-                        "UPDATE DB SET { schema_version := <int16>$0 }", self.version,
-                    )
-            except Exception as e:
-                raise MigrationError(f"Error running {self}: {e}")
+        with open(f"{MIGRATIONS_FOLDER}/{filename}", "rb") as f:
+            content = f.read()
+
+        self.query = content.decode()
+        self.checksum = hashlib.sha256(content).hexdigest()
+
+    async def run(self, pool: edgedb.AsyncIOPool, checksums: Sequence[str]) -> None:
+        """Apply migration and record version with checksums of all applied files."""
+
+        try:
+            await _apply(pool, self.query, self.version, checksums)
+        except Exception as e:
+            raise MigrationError(f"Error running {self}: {e}")
 
     def __str__(self) -> str:
         return _fmt_db_version(self.version)
 
 
-def _migrate_edgedb(config: Config) -> None:
-    conn = edgedb.connect(**config["edgedb"])
+def _load_migrations() -> List[EdgeDBMigration]:
+    """
+    Read migration files ordered by version parsed from filename.
 
-    can_fetch_database_version = conn.fetchone(
-        """
-        SELECT EXISTS (
-            WITH MODULE schema
-            SELECT ObjectType{name}
-            filter .name = 'default::DB'
-            LIMIT 1
-        )
-        """
+    Versions must start from 0 and have no gaps or duplicates.
+    """
+
+    migrations = sorted(
+        (
+            EdgeDBMigration(filename)
+            for filename in os.listdir(MIGRATIONS_FOLDER)
+            if filename.endswith(".edgeql")
+        ),
+        key=lambda m: m.version,
     )
 
-    if can_fetch_database_version:
-        database_version = conn.fetchone("SELECT DB.schema_version LIMIT 1")
+    for expected, migration in enumerate(migrations):
+        if migration.version != expected:
+            raise MigrationError(
+                f"Expected migration {_fmt_db_version(expected)}, found {migration} "
+                f"{migration.name}"
+            )
+
+    return migrations
+
+
+def _digest(migrations: Sequence[EdgeDBMigration]) -> str:
+    return hashlib.sha256("".join(m.checksum for m in migrations).encode()).hexdigest()
+
+
+class Snapshot:
+    """
+    Migrations up to version squashed into single file for fresh databases.
+
+    Digest of included migration checksums is stored in header, snapshot is ignored
+    if any of them changed. Snapshot that is behind latest migration is still used,
+    remaining migrations are applied after it.
+    """
+
+    def __init__(self, version: int, digest: str, query: str) -> None:
+        self.version = version
+        self.digest = digest
+        self.query = query
+
+    @classmethod
+    def load(cls) -> Optional[Snapshot]:
+        if not os.path.exists(SNAPSHOT_FILE):
+            return None
+
+        with open(SNAPSHOT_FILE) as f:
+            query = f.read()
+
+        header, _, _ = query.partition("\n")
+
+        try:
+            version, digest = header[len(SNAPSHOT_HEADER) :].split()
+
+            return cls(int(version), digest, query)
+        except ValueError:
+            raise MigrationError(f"Bad snapshot header: {header}")
+
+    def matches(self, migrations: Sequence[EdgeDBMigration]) -> bool:
+        if self.version >= len(migrations):
+            return False
+
+        return _digest(migrations[: self.version + 1]) == self.digest
+
+    async def run(self, pool: edgedb.AsyncIOPool, checksums: Sequence[str]) -> None:
+        try:
+            await _apply(pool, self.query, self.version, checksums)
+        except Exception as e:
+            raise MigrationError(f"Error running snapshot {self}: {e}")
+
+    def __str__(self) -> str:
+        return _fmt_db_version(self.version)
+
+
+def squash_migrations() -> None:
+    """
+    Build snapshot from schema file and data statements of all migrations.
+
+    Schema workarounds of init migration are kept because snapshot is also applied
+    to empty database. Data statements must be valid against latest schema.
+    """
+
+    migrations = _load_migrations()
+    latest = migrations[-1]
+
+    with open(SCHEMA_FILE) as f:
+        schema = [f"    {line}".rstrip(" ") for line in f.read().splitlines()]
+
+    prelude, _, rest = migrations[0].query.partition(SCHEMA_START)
+
+    statements = []
+    for migration in migrations:
+        _, _, rest = migration.query.partition(SCHEMA_START)
+        block, _, data = rest.partition(SCHEMA_END)
+
+        if migration is latest:
+            block_lines = [line.rstrip(" ") for line in block.splitlines()]
+
+            # CREATE MIGRATION line goes first, }; and COMMIT MIGRATION lines go last
+            if block_lines[2:-3] != schema:
+                raise MigrationError(
+                    f"{SCHEMA_FILE} differs from latest migration {latest}, "
+                    "create migration first"
+                )
+
+        if data.strip():
+            statements.append(data.strip())
+
+    lines = [
+        f"{SNAPSHOT_HEADER} {latest.version} {_digest(migrations)}",
+        f"# squashed migrations {migrations[0]} - {latest}, do not edit",
+        "",
+        prelude.strip(),
+        "",
+        SCHEMA_START,
+        "CREATE MIGRATION snapshot TO {",
+        *schema,
+        "};",
+        "",
+        "COMMIT MIGRATION snapshot;",
+        SCHEMA_END,
+        "",
+        "\n\n".join(statements),
+    ]
+
+    with open(SNAPSHOT_FILE, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    log.info(f"squashed {len(migrations)} migrations into {SNAPSHOT_FILE}")
+
+
+async def _fetch_state(pool: edgedb.AsyncIOPool) -> Tuple[int, Optional[List[str]]]:
+    """Return database version and checksums. None checksums cannot be verified."""
+
+    try:
+        db = await pool.fetchone("SELECT DB { schema_version, checksums } LIMIT 1")
+    except edgedb.InvalidReferenceError:
+        # DB type or checksums property does not exist yet
+        pass
     else:
-        database_version = -1
+        if db.checksums is None:
+            return db.schema_version, None
 
-    filenames = sorted(os.listdir(MIGRATIONS_FOLDER))
-    filenames = filenames[database_version + 1 :]
+        return db.schema_version, list(db.checksums)
 
-    if filenames:
-        log.debug(
-            f"applying {len(filenames)} migrations to version {_fmt_db_version(database_version)}"
+    try:
+        return await pool.fetchone("SELECT DB.schema_version LIMIT 1"), None
+    except edgedb.InvalidReferenceError:
+        return -1, None
+
+
+def _verify(
+    migrations: Sequence[EdgeDBMigration], version: int, checksums: Optional[List[str]]
+) -> None:
+    if version >= len(migrations):
+        raise MigrationError(
+            f"Database version {_fmt_db_version(version)} is newer than latest "
+            f"migration {_fmt_db_version(len(migrations) - 1)}"
         )
-    else:
-        log.debug(f"no new migrations from version {_fmt_db_version(database_version)}")
 
+    if checksums is None:
         return
 
-    try:
-        for filename in filenames:
-            migration = EdgeDBMigration(filename)
+    for migration, checksum in zip(migrations, checksums):
+        if migration.checksum != checksum:
+            raise MigrationError(
+                f"Applied migration {migration} {migration.name} was edited or reordered"
+            )
+
+
+async def migrate(app: web.Application) -> None:
+    pool = app["edgedb"]
+
+    # files are read while state is fetched
+    migrations, snapshot, (database_version, checksums) = await asyncio.gather(
+        run_blocking(app, _load_migrations),
+        run_blocking(app, Snapshot.load),
+        _fetch_state(pool),
+    )
+
+    _verify(migrations, database_version, checksums)
+
+    if database_version == -1 and snapshot is not None:
+        if snapshot.matches(migrations):
+            log.info(f"bootstrapping database from snapshot {snapshot}")
 
-            log.info(
-                f"migrating {_fmt_db_version(database_version)} -> {migration} {migration.name}"
+            await snapshot.run(
+                pool, [m.checksum for m in migrations[: snapshot.version + 1]]
             )
 
-            migration.run(conn)
+            database_version = snapshot.version
+        else:
+            log.warning("snapshot does not match migrations, applying all of them")
 
-            database_version += 1
-    except MigrationError as e:
-        log.fatal(f"Migration error: {e}")
+    pending = migrations[database_version + 1 :]
+    if not pending:
+        log.debug(f"no new migrations from version {_fmt_db_version(database_version)}")
+
+        return
+
+    log.debug(
+        f"applying {len(pending)} migrations to version {_fmt_db_version(database_version)}"
+    )
+
+    for migration in pending:
+        log.info(
+            f"migrating {_fmt_db_version(database_version)} -> {migration} {migration.name}"
+        )
+
+        await migration.run(
+            pool, [m.checksum for m in migrations[: migration.version + 1]]
+        )
 
-        sys.exit(1)
+        database_version = migration.version
 
     log.info("finished migrations")
 
 
-def migrate(config: Config) -> None:
-    _migrate_edgedb(config)
+def setup(app: web.Application) -> None:
+    app["startup"].add("migrations", migrate, after=("edgedb",))
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+BUFFER_SIZE = 64 * 1024
+
+
+class TCPProxy:
+    """
+    Forwards TCP connections to upstream port.
+
+    Changing upstream affects only new connections, existing ones stay with previous
+    upstream until closed.
+    """
+
+    def __init__(self, upstream_host: str, upstream_port: int):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str, port: int, reuse_port: bool = False) -> None:
+        self._server = await asyncio.start_server(
+            self._handle, host, port, reuse_port=reuse_port or None
+        )
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+
+        self._server.close()
+        await self._server.wait_closed()
+
+    @staticmethod
+    async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                data = await reader.read(BUFFER_SIZE)
+                if not data:
+                    break
+
+                writer.write(data)
+                await writer.drain()
+
+            # pass half close further, other direction can still be active
+            if writer.can_write_eof():
+                writer.write_eof()
+        except ConnectionError:
+            writer.close()
+
+    async def _handle(
+        self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(
+                self.upstream_host, self.upstream_port
+            )
+        except OSError as e:
+            log.warning(f"unable to connect to upstream {self.upstream_port}: {e}")
+            client_writer.close()
+
+            return
+
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, upstream_writer),
+                self._pipe(upstream_reader, client_writer),
+            )
+        finally:
+            upstream_writer.close()
+            client_writer.close()
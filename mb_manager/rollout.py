@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import os
+import asyncio
+import logging
+
+from typing import Any, Tuple, Optional, NamedTuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from aiohttp import web
+
+from .proxy import TCPProxy
+from .docker import Docker, DockerException
+from .executor import run_blocking
+
+log = logging.getLogger(__name__)
+
+WORKER_IMAGE_NAME = "modbay1/worker"
+
+STANDBY_NAME_SUFFIX = ".next"
+
+# seconds to wait for standby container healthcheck
+HEALTHCHECK_TIMEOUT = 120
+HEALTHCHECK_POLL_INTERVAL = 0.5
+
+
+class WorkerSlot(NamedTuple):
+    name: str
+    port: int
+
+
+class WorkerSlots:
+    """
+    Worker container names and host ports.
+
+    In blue/green mode there are 2 slots and manager proxies worker port to active one,
+    it requires manager handoff to keep connections open on manager update. Otherwise single slot binds worker port directly. Worker ports are bound to host
+    address, manager reaches them only with host network.
+    """
+
+    def __init__(self, config: Any):
+        rollout_config = config["supervisor"]["rollout"]
+        name = config["supervisor"]["worker_container_name"]
+
+        self.blue_green = rollout_config["blue_green"]
+        self.host = rollout_config["host"]
+
+        self._state_file = rollout_config["state_file"]
+
+        self.slots: Tuple[WorkerSlot, ...]
+        if self.blue_green:
+            self.slots = (
+                WorkerSlot(name, rollout_config["blue_port"]),
+                WorkerSlot(
+                    f"{name}{STANDBY_NAME_SUFFIX}", rollout_config["green_port"]
+                ),
+            )
+        else:
+            self.slots = (WorkerSlot(name, rollout_config["port"]),)
+
+        self.active = self.slots[0]
+
+        self._healthcheck_path = urlsplit(config["supervisor"]["healthcheck_url"]).path
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(s.name for s in self.slots)
+
+    @property
+    def standby(self) -> WorkerSlot:
+        if not self.blue_green:
+            raise RuntimeError("standby slot only exists in blue/green mode")
+
+        return self.slots[1] if self.active == self.slots[0] else self.slots[0]
+
+    def healthcheck_url(self, slot: WorkerSlot) -> str:
+        return f"http://{self.host}:{slot.port}{self._healthcheck_path}"
+
+    def load_active(self) -> Optional[WorkerSlot]:
+        """Slot saved by latest switch. Blocking."""
+
+        try:
+            with open(self._state_file) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        for slot in self.slots:
+            if slot.name == name:
+                return slot
+
+        log.warning(f"unknown worker container {name} in {self._state_file}")
+
+        return None
+
+    def save_active(self, slot: WorkerSlot) -> None:
+        """Replace saved slot atomically. Blocking."""
+
+        os.makedirs(os.path.dirname(self._state_file) or ".", exist_ok=True)
+
+        tmp_path = f"{self._state_file}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(slot.name)
+
+        os.replace(tmp_path, self._state_file)
+
+    async def detect_active(self, app: web.Application) -> None:
+        """
+        Pick slot saved by latest switch as active one.
+
+        Both containers run during rollout, so running container is picked only when
+        nothing was saved yet. First slot is used by default.
+        """
+
+        docker: Docker = app["docker"]
+
+        if self.blue_green:
+            saved = await run_blocking(app, self.load_active)
+            if saved is not None:
+                self.active = saved
+
+                log.info(f"active worker container: {self.active.name}")
+
+                return
+
+        for slot in self.slots:
+            try:
+                container = await docker.inspect(slot.name)
+            except DockerException as e:
+                if e.status != 404:
+                    raise
+
+                continue
+
+            if container["State"]["Running"]:
+                self.active = slot
+
+                break
+
+        log.info(f"active worker container: {self.active.name}")
+
+        if self.blue_green:
+            await run_blocking(app, self.save_active, self.active)
+
+
+async def create_worker(docker: Docker, slot: WorkerSlot, host: str) -> None:
+    create_body = {
+        "User": "root",  # TODO: do not use root?
+        "Cmd": ("-v", "debug"),
+        "Image": f"{docker.registry_address}/{WORKER_IMAGE_NAME}",
+        "HostConfig": {
+            "Binds": ("/home/modbay/worker_config.yaml:/code/config.yaml",),
+            "PortBindings": {
+                "8080/tcp": ({"HostIp": host, "HostPort": str(slot.port)},)
+            },
+            "AutoRemove": True,
+        },
+    }
+
+    await docker.create(slot.name, create_body)
+    await docker.start(slot.name)
+
+
+async def _wait_healthy(url: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+
+            await asyncio.sleep(HEALTHCHECK_POLL_INTERVAL)
+
+
+async def start_standby(app: web.Application) -> WorkerSlot:
+    """Start worker in standby slot and wait until it passes healthcheck."""
+
+    docker: Docker = app["docker"]
+    slots: WorkerSlots = app["worker_slots"]
+
+    standby = slots.standby
+
+    # leftover of failed rollout
+    try:
+        await docker.remove(standby.name, force=True)
+    except DockerException as e:
+        if e.status != 404:
+            raise
+
+    await create_worker(docker, standby, slots.host)
+
+    try:
+        await asyncio.wait_for(
+            _wait_healthy(slots.healthcheck_url(standby)), HEALTHCHECK_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        log.error(f"standby worker {standby.name} is unhealthy, removing")
+
+        await docker.remove(standby.name, force=True)
+
+        raise
+
+    return standby
+
+
+async def switch(app: web.Application, slot: WorkerSlot) -> None:
+    """Make slot active. New connections go to it, existing ones are kept."""
+
+    slots: WorkerSlots = app["worker_slots"]
+    proxy: Optional[TCPProxy] = app["worker_proxy"]
+
+    # saved first, restarted manager must not pick container that is about to stop
+    await run_blocking(app, slots.save_active, slot)
+
+    slots.active = slot
+    if proxy is not None:
+        proxy.upstream_port = slot.port
+
+    log.info(f"switched worker to {slot.name}")
+
+
+async def _start(app: web.Application) -> None:
+    slots: WorkerSlots = app["worker_slots"]
+
+    await slots.detect_active(app)
+
+    if not slots.blue_green:
+        return
+
+    manager_config = app["config"]["manager"]
+
+    proxy = TCPProxy(slots.host, slots.active.port)
+    await proxy.start(
+        slots.host,
+        app["config"]["supervisor"]["rollout"]["port"],
+        reuse_port=manager_config["handoff"],
+    )
+
+    app["worker_proxy"] = proxy
+
+
+async def _stop(app: web.Application) -> None:
+    if app["worker_proxy"] is not None:
+        await app["worker_proxy"].close()
+
+
+def setup(app: web.Application) -> None:
+    app["worker_slots"] = WorkerSlots(app["config"])
+    app["worker_proxy"] = None
+
+    app["startup"].add("rollout", _start, after=("docker",))
+    app.on_cleanup.append(_stop)
@@ -1,7 +1,12 @@
 from aiohttp import web
 
+from .status import routes as status_routes
+from .webhooks import setup as setup_webhooks
 from .webhooks import routes as webhook_routes
 
 
 def setup(app: web.Application) -> None:
+    app.add_routes(status_routes)
     app.add_routes(webhook_routes)
+
+    setup_webhooks(app)
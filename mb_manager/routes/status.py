@@ -0,0 +1,48 @@
+from aiohttp import web
+
+from ..tasks import BaseTask, HTTPSupervisor
+from ..handoff import INSTANCE_ID
+
+routes = web.RouteTableDef()
+
+
+@routes.get("/status/deploys")
+async def deploys(req: web.Request) -> web.Response:
+    return web.json_response(req.config_dict["deploys"].to_json())
+
+
+@routes.get("/status/ready")
+async def ready(req: web.Request) -> web.Response:
+    status = 200 if req.config_dict["startup"].ready.is_set() else 503
+
+    return web.json_response(dict(instance=INSTANCE_ID), status=status)
+
+
+@routes.get("/status/startup")
+async def startup(req: web.Request) -> web.Response:
+    return web.json_response(req.config_dict["startup"].to_json())
+
+
+@routes.get("/status/tasks")
+async def tasks(req: web.Request) -> web.Response:
+    return web.json_response(
+        {
+            task.name: dict(interval=task.interval, **task.metrics.to_json())
+            for task in BaseTask._instances
+        }
+    )
+
+
+@routes.get("/status/probes")
+async def probes(req: web.Request) -> web.Response:
+    supervisor = HTTPSupervisor._get_instance()
+    assert isinstance(supervisor, HTTPSupervisor)
+
+    return web.json_response([e.to_json() for e in supervisor.endpoints])
+
+
+@routes.get("/status/executors")
+async def executors(req: web.Request) -> web.Response:
+    return web.json_response(
+        {name: e.to_json() for name, e in req.config_dict["executors"].items()}
+    )
@@ -1,9 +1,16 @@
+import os
+import time
 import asyncio
 import logging
 
+from typing import Any, Mapping
+
 from aiohttp import web
 
+from ..deploy import Deploy, DeployQueue, DeployRegistry
 from ..docker import Docker, DockerException
+from ..handoff import handoff
+from ..rollout import WorkerSlots, switch, start_standby
 
 log = logging.getLogger(__name__)
 
@@ -14,7 +21,9 @@ MANAGER_DOCKER_IMAGE = f"{PROJECT_NAME}/manager"
 WORKER_DOCKER_IMAGE = f"{PROJECT_NAME}/worker"
 
 MANAGER_CONTAINER_NAME = "modbay-manager.service"
-WORKER_CONTAINER_NAME = "modbay-worker.service"
+
+# seconds to wait for supervisor to start new worker container
+RECREATE_TIMEOUT = 60
 
 
 def _validate_request(req: web.Request) -> None:
@@ -34,14 +43,20 @@ def _validate_request(req: web.Request) -> None:
         raise web.HTTPSuccessful()
 
 
+def _submit_deploy(req: web.Request, target: str, hook_data: Any) -> None:
+    pipeline = hook_data["object_attributes"]
+
+    if pipeline["status"] != "success":
+        return
+
+    req.config_dict["deploy_queues"][target].submit(pipeline["id"], req.app)
+
+
 @routes.post("/wh/gitlab/manager")
 async def gitlab_manager_wh(req: web.Request) -> web.Response:
     _validate_request(req)
 
-    hook_data = await req.json()
-
-    if hook_data["object_attributes"]["status"] == "success":
-        asyncio.create_task(update_self(req))
+    _submit_deploy(req, "manager", await req.json())
 
     return web.Response()
 
@@ -50,41 +65,157 @@ async def gitlab_manager_wh(req: web.Request) -> web.Response:
 async def gitlab_backend_wh(req: web.Request) -> web.Response:
     _validate_request(req)
 
-    hook_data = await req.json()
-
-    if hook_data["object_attributes"]["status"] == "success":
-        asyncio.create_task(update_worker(req))
+    _submit_deploy(req, "worker", await req.json())
 
     return web.Response()
 
 
-async def update_self(req: web.Request) -> None:
+async def _is_up_to_date(
+    docker: Docker,
+    image: str,
+    container_name: str,
+    registry_credentials: Mapping[str, Any],
+) -> bool:
+    """
+    Check if container runs image with same digest as registry one.
+
+    Registry errors are logged and treated as outdated image.
+    """
+
+    try:
+        remote_digest = await docker.distribution_digest(
+            f"{image}:latest", registry_credentials=registry_credentials
+        )
+    except DockerException:
+        log.exception(f"unable to fetch {image} digest from registry")
+
+        return False
+
+    if remote_digest not in await docker.local_digests(f"{image}:latest"):
+        return False
+
+    try:
+        container = await docker.inspect(container_name)
+    except DockerException as e:
+        if e.status != 404:
+            raise
+
+        # container is missing, pulling does not help
+        return True
+
+    local_image = await docker.inspect_image(f"{image}:latest")
+
+    return bool(container["Image"] == local_image["Id"])
+
+
+async def update_self(app: web.Application, deploy: Deploy) -> None:
     log.info("updating self")
 
-    docker = req.config_dict["docker"]
+    docker = app["docker"]
+    image = f"{docker.registry_address}/{MANAGER_DOCKER_IMAGE}"
+    registry_credentials = app["config"]["docker"]["registry"]["manager"]
+
+    # changes after every handoff
+    container_name = os.environ.get("MODBAY_CONTAINER_NAME", MANAGER_CONTAINER_NAME)
+
+    with deploy.stage("check"):
+        up_to_date = await _is_up_to_date(
+            docker, image, container_name, registry_credentials
+        )
+
+    if up_to_date:
+        log.info("manager image did not change, skipping update")
+        deploy.skip()
 
-    await docker.pull(
-        f"{docker.registry_address}/{MANAGER_DOCKER_IMAGE}",
-        registry_credentials=req.config_dict["config"]["docker"]["registry"]["manager"],
+        return
+
+    with deploy.stage("pull"):
+        await docker.pull(image, registry_credentials=registry_credentials)
+
+    if app["config"]["manager"]["handoff"]:
+        with deploy.stage("handoff"):
+            await handoff(app, image, container_name)
+    else:
+        with deploy.stage("stop"):
+            await app["shutdown_handler"]()
+
+
+async def _wait_for_start(docker: Docker, container_name: str, since: int) -> None:
+    events = await docker.events(
+        filters=dict(type=["container"], container=[container_name], event=["start"]),
+        since=since,
     )
-    await req.config_dict["shutdown_handler"]()
 
+    async for _ in events:
+        return
 
-async def update_worker(req: web.Request) -> None:
+
+async def update_worker(app: web.Application, deploy: Deploy) -> None:
     log.info("updating worker")
 
-    docker = req.config_dict["docker"]
+    docker = app["docker"]
+    slots: WorkerSlots = app["worker_slots"]
+    image = f"{docker.registry_address}/{WORKER_DOCKER_IMAGE}"
+    registry_credentials = app["config"]["docker"]["registry"]["worker"]
 
-    await docker.pull(
-        f"{docker.registry_address}/{WORKER_DOCKER_IMAGE}",
-        registry_credentials=req.config_dict["config"]["docker"]["registry"]["worker"],
-    )
+    previous = slots.active
 
-    try:
-        # container will be removed automatically and restarted by supervisor task
-        await docker.stop(WORKER_CONTAINER_NAME)
-    except DockerException as e:
-        if e.status != 404:
-            raise
+    with deploy.stage("check"):
+        up_to_date = await _is_up_to_date(
+            docker, image, previous.name, registry_credentials
+        )
+
+    if up_to_date:
+        log.info("worker image did not change, skipping update")
+        deploy.skip()
+
+        return
+
+    with deploy.stage("pull"):
+        await docker.pull(image, registry_credentials=registry_credentials)
+
+    if slots.blue_green:
+        with deploy.stage("standby"):
+            standby = await start_standby(app)
+
+        with deploy.stage("switch"):
+            await switch(app, standby)
+
+    stopped_at = time.time_ns()
+
+    with deploy.stage("stop"):
+        try:
+            # in blue/green mode supervisor ignores inactive container, otherwise
+            # container will be removed automatically and restarted by supervisor
+            await docker.stop(previous.name)
+        except DockerException as e:
+            if e.status != 404:
+                raise
+
+            log.error("worker container is not running")
+
+    if slots.blue_green:
+        return
+
+    with deploy.stage("recreate"):
+        await asyncio.wait_for(
+            _wait_for_start(docker, previous.name, stopped_at), RECREATE_TIMEOUT
+        )
+
+
+async def _cancel_deploys(app: web.Application) -> None:
+    await asyncio.gather(*(q.cancel() for q in app["deploy_queues"].values()))
+
+
+def setup(app: web.Application) -> None:
+    debounce = app["config"]["deploy"]["debounce"]
+
+    registry = DeployRegistry()
+
+    app["deploys"] = registry
+    app["deploy_queues"] = {
+        "manager": DeployQueue("manager", update_self, debounce, registry),
+        "worker": DeployQueue("worker", update_worker, debounce, registry),
+    }
 
-        log.error("worker container is not running")
+    app.on_cleanup.append(_cancel_deploys)
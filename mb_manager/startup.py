@@ -0,0 +1,131 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+
+from typing import Any, Dict, Tuple, Callable, Optional, Sequence, Awaitable
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+_PhaseFn = Callable[[web.Application], Awaitable[None]]
+_Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+class StartupPipeline:
+    """
+    Runs startup phases concurrently in background, respecting dependencies.
+
+    HTTP listener starts before phases finish. Requests get 503 until ready is set.
+    """
+
+    def __init__(self) -> None:
+        self._phases: Dict[str, Tuple[_PhaseFn, Tuple[str, ...]]] = {}
+
+        # seconds since pipeline start
+        self.durations: Dict[str, float] = {}
+        self.total: Optional[float] = None
+        self.failed = False
+
+        self._task: Optional[asyncio.Task[None]] = None
+
+        # created in start, event loop is not running yet
+        self.ready: asyncio.Event
+
+    def add(self, name: str, fn: _PhaseFn, after: Sequence[str] = ()) -> None:
+        self._phases[name] = (fn, tuple(after))
+
+    async def start(self, app: web.Application) -> None:
+        self.ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run(app))
+
+    async def cancel(self, app: web.Application) -> None:
+        if self._task is None or self._task.done():
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self, app: web.Application) -> None:
+        started_at = time.monotonic()
+
+        finished: Dict[str, asyncio.Event] = {
+            name: asyncio.Event() for name in self._phases
+        }
+
+        async def run_phase(name: str) -> None:
+            fn, after = self._phases[name]
+
+            for dependency in after:
+                await finished[dependency].wait()
+
+            phase_started_at = time.monotonic()
+
+            await fn(app)
+
+            self.durations[name] = time.monotonic() - phase_started_at
+            finished[name].set()
+
+            log.info(f"startup phase {name} took {self.durations[name]:.3f}s")
+
+        phases = [asyncio.create_task(run_phase(name)) for name in self._phases]
+        try:
+            await asyncio.gather(*phases)
+        except Exception:
+            for phase in phases:
+                phase.cancel()
+
+            log.exception("startup failed, stopping")
+            self.failed = True
+
+            # aiohttp handles SIGTERM by running shutdown and cleanup
+            os.kill(os.getpid(), signal.SIGTERM)
+
+            return
+
+        self.total = time.monotonic() - started_at
+        self.ready.set()
+
+        log.info(f"startup finished in {self.total:.3f}s")
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(
+            ready=self.ready.is_set(),
+            failed=self.failed,
+            total=self.total,
+            phases=self.durations,
+        )
+
+
+@web.middleware
+async def readiness_middleware(
+    request: web.Request, handler: _Handler
+) -> web.StreamResponse:
+    # status routes stay available to report startup progress
+    if request.path.startswith("/status/"):
+        return await handler(request)
+
+    if not request.app["startup"].ready.is_set():
+        raise web.HTTPServiceUnavailable(
+            text="starting up", headers={"Retry-After": "5"}
+        )
+
+    return await handler(request)
+
+
+def setup(app: web.Application) -> None:
+    pipeline = StartupPipeline()
+
+    app["startup"] = pipeline
+
+    app.middlewares.append(readiness_middleware)
+
+    app.on_startup.append(pipeline.start)
+    # phases could still be running, stop them before anything else is shut down
+    app.on_shutdown.append(pipeline.cancel)
@@ -1,9 +1,16 @@
 from aiohttp import web
 
 from .task import BaseTask
+from .leader_tasks import *
+from .backfill_tasks import *
 from .supervisor_tasks import *
 
 
 def setup(app: web.Application) -> None:
-    app.on_startup.append(BaseTask.schedule_all)
-    app.on_cleanup.append(BaseTask.cancel_all)
+    app["startup"].add(
+        "tasks",
+        BaseTask.schedule_all,
+        after=("docker", "edgedb", "migrations", "rollout"),
+    )
+    # tasks are stopped before docker and edgedb connections are closed on cleanup
+    app.on_shutdown.append(BaseTask.cancel_all)
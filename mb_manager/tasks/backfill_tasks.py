@@ -0,0 +1,76 @@
+import logging
+import functools
+
+from aiohttp import web
+
+from ..db import leases
+from .task import BaseTask
+from ..handoff import INSTANCE_ID
+from ..backfill import load_backfills
+from ..executor import run_blocking
+from .leader_tasks import LEASE_NAME
+from ..db.backfills import NIL_CURSOR, create, fetch_all
+
+# add class into this list to enable task
+__all__ = ("BackfillRunner",)
+
+log = logging.getLogger(__name__)
+
+
+class BackfillRunner(BaseTask):
+    """
+    Runs unfinished data backfills one after another in background.
+
+    Run is cancelled on shutdown or leadership loss, current batch transaction is
+    rolled back and next run resumes from saved cursor.
+    """
+
+    interval = 60
+
+    singleton = True
+
+    async def setup(self, app: web.Application) -> None:
+        await super().setup(app)
+
+        backfill_config = app["config"]["backfill"]
+
+        self._pool = app["edgedb"]
+        # files are only changed by deploy which restarts manager
+        self._backfills = await run_blocking(app, load_backfills)
+
+        self._batch_size = backfill_config["batch_size"]
+        self._rows_per_second = backfill_config["rows_per_second"]
+
+        self.interval = backfill_config["interval"]
+
+    async def run_once(self) -> None:
+        token = self.fencing_token()
+
+        # batches of stale leader are rolled back once other manager takes lease over
+        fence = (
+            None
+            if token is None
+            else functools.partial(
+                leases.check, name=LEASE_NAME, holder=INSTANCE_ID, token=token
+            )
+        )
+
+        progress = await fetch_all(self._pool)
+
+        for backfill in self._backfills:
+            state = progress.get(backfill.name)
+
+            if state is None:
+                await create(self._pool, backfill.name)
+
+                cursor = NIL_CURSOR
+            elif state.finished:
+                continue
+            else:
+                cursor = state.cursor
+
+                log.info(f"resuming backfill {backfill.name} after {state.rows} rows")
+
+            await backfill.run(
+                self._pool, cursor, self._batch_size, self._rows_per_second, fence
+            )
@@ -0,0 +1,36 @@
+import abc
+
+from typing import Optional
+
+from aiohttp import web
+
+from .task import BaseTask
+from ..executor import run_blocking
+
+
+class ExecutorTask(BaseTask):
+    """
+    Task that runs blocking code in app executor instead of event loop.
+
+    run_sync is a staticmethod, task instance cannot be pickled for process pool.
+    """
+
+    # use process pool instead of thread pool
+    process = False
+    # seconds, None means no limit
+    timeout: Optional[float] = None
+
+    async def setup(self, app: web.Application) -> None:
+        await super().setup(app)
+
+        self._app = app
+
+    async def run_once(self) -> None:
+        await run_blocking(
+            self._app, self.run_sync, timeout=self.timeout, process=self.process
+        )
+
+    @staticmethod
+    @abc.abstractmethod
+    def run_sync() -> None:
+        raise NotImplementedError
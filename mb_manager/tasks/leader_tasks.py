@@ -0,0 +1,114 @@
+import time
+import asyncio
+import logging
+
+from typing import Optional
+
+from aiohttp import web
+
+from ..db import leases
+from .task import BaseTask
+from ..handoff import INSTANCE_ID
+
+# add class into this list to enable task
+__all__ = ("LeaderLease",)
+
+log = logging.getLogger(__name__)
+
+LEASE_NAME = "manager-leader"
+
+# part of TTL leader gives up early to cover clock rate difference and stopping tasks
+LEASE_SAFETY_MARGIN = 0.2
+
+
+class LeaderLease(BaseTask):
+    """
+    Elects single manager that runs singleton tasks using lease stored in EdgeDB.
+
+    Lease is renewed 3 times per TTL, each renewal is limited to TTL/3. Leadership is
+    given up as soon as renewal fails or local deadline passes, whichever is first,
+    follower takes over once lease expires.
+
+    Local deadline is counted from moment renewal was sent. Database counts TTL from
+    later moment, so leader always steps down before lease can be taken over.
+    """
+
+    interval = 5
+
+    async def setup(self, app: web.Application) -> None:
+        await super().setup(app)
+
+        leader_config = app["config"]["leader"]
+
+        if not leader_config["enabled"]:
+            self.interval = -1
+
+            return
+
+        self._pool = app["edgedb"]
+        self._ttl = leader_config["ttl"]
+
+        self.interval = self._ttl / 3
+        self.token: Optional[int] = None
+
+        self._expiry: Optional[asyncio.Task[None]] = None
+
+        await BaseTask.set_leader(False)
+
+    async def run_once(self) -> None:
+        sent_at = time.monotonic()
+
+        try:
+            token = await asyncio.wait_for(
+                leases.acquire(self._pool, LEASE_NAME, INSTANCE_ID, self._ttl),
+                self._ttl / 3,
+            )
+        except Exception:
+            # other manager takes over after TTL, stop before that
+            token = None
+
+            log.exception("unable to renew lease")
+
+        if token is None:
+            await self._step_down()
+
+            return
+
+        if token != self.token:
+            log.info(f"acquired leader lease, fencing token: {token}")
+
+        self.token = token
+
+        deadline = sent_at + self._ttl * (1 - LEASE_SAFETY_MARGIN)
+
+        await BaseTask.set_leader(True, token, deadline)
+
+        self._cancel_expiry()
+        self._expiry = asyncio.create_task(self._expire(deadline))
+
+    async def _expire(self, deadline: float) -> None:
+        await asyncio.sleep(deadline - time.monotonic())
+
+        log.warning("leader lease was not renewed in time")
+
+        await self._step_down()
+
+    async def _step_down(self) -> None:
+        self.token = None
+
+        await BaseTask.set_leader(False)
+
+    def _cancel_expiry(self) -> None:
+        if self._expiry is not None and self._expiry is not asyncio.current_task():
+            self._expiry.cancel()
+
+    async def stop(self) -> None:
+        if self.interval == -1:
+            return
+
+        self._cancel_expiry()
+
+        if self.token is None:
+            return
+
+        await leases.release(self._pool, LEASE_NAME, INSTANCE_ID)
@@ -0,0 +1,106 @@
+import math
+import time
+import array
+import bisect
+
+from typing import Any, Dict, List, Optional
+
+# upper bounds of run duration histogram buckets in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, math.inf)
+
+
+class TaskMetrics:
+    """Execution statistics of single task. Timestamps are unix time."""
+
+    def __init__(self) -> None:
+        self.buckets: List[int] = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+
+        self.successes = 0
+        self.failures = 0
+        # runs that took longer than interval
+        self.overruns = 0
+
+        # ticks not run because previous run was still going
+        self.skipped_ticks = 0
+        # ticks lost because scheduler was late
+        self.missed_ticks = 0
+
+        self.paused_seconds = 0.0
+
+        self.last_started_at: Optional[float] = None
+        self.last_finished_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+
+    def started(self) -> None:
+        self.last_started_at = time.time()
+
+    def finished(self, duration: float, success: bool, interval: float) -> None:
+        self.last_finished_at = time.time()
+        self.last_duration = duration
+
+        self.buckets[bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+        self.duration_sum += duration
+
+        if success:
+            self.successes += 1
+        else:
+            self.failures += 1
+
+        if duration > interval:
+            self.overruns += 1
+
+    @property
+    def runs(self) -> int:
+        return self.successes + self.failures
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(
+            runs=self.runs,
+            successes=self.successes,
+            failures=self.failures,
+            overruns=self.overruns,
+            skipped_ticks=self.skipped_ticks,
+            missed_ticks=self.missed_ticks,
+            paused_seconds=self.paused_seconds,
+            last_started_at=self.last_started_at,
+            last_finished_at=self.last_finished_at,
+            last_duration=self.last_duration,
+            duration_sum=self.duration_sum,
+            duration_buckets=[
+                # inf is not valid json
+                dict(le=None if math.isinf(le) else le, count=count)
+                for le, count in zip(DURATION_BUCKETS, self.buckets)
+            ],
+        )
+
+
+class LatencyWindow:
+    """Ring buffer of latest latencies in seconds."""
+
+    def __init__(self, size: int) -> None:
+        self._samples = array.array("d", bytes(8 * size))
+        self._size = size
+        self._position = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, latency: float) -> None:
+        self._samples[self._position] = latency
+
+        self._position = (self._position + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def percentiles(self, *ranks: float) -> List[Optional[float]]:
+        """Nearest-rank percentiles, None if window is empty."""
+
+        if not self._count:
+            return [None] * len(ranks)
+
+        ordered = sorted(self._samples[: self._count])
+
+        return [
+            ordered[max(math.ceil(rank / 100 * self._count) - 1, 0)] for rank in ranks
+        ]
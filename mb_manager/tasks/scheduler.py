@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import heapq
+import random
+import asyncio
+import logging
+
+from typing import TYPE_CHECKING, Set, List, Tuple, Optional
+
+if TYPE_CHECKING:
+    from .task import BaseTask
+
+log = logging.getLogger(__name__)
+
+# what to do when task is still running at next tick
+OVERRUN_SKIP = "skip"
+OVERRUN_QUEUE = "queue"
+OVERRUN_CONCURRENT = "concurrent"
+
+OVERRUN_POLICIES = (OVERRUN_SKIP, OVERRUN_QUEUE, OVERRUN_CONCURRENT)
+
+
+class Scheduler:
+    """
+    Runs tasks on fixed periods using single timer.
+
+    Deadlines are kept in min-heap on monotonic clock. Next deadline is calculated from
+    previous one, not from run end, so periods do not drift. Jitter only shifts single
+    run, it does not accumulate. Long running tasks are not ticked while they run, next
+    run is scheduled interval after previous one ends.
+    """
+
+    def __init__(self) -> None:
+        # (fire time, insertion counter, task)
+        self._heap: List[Tuple[float, int, BaseTask]] = []
+        self._counter = 0
+
+        self._runs: Set[asyncio.Task[None]] = set()
+        self._task: Optional[asyncio.Task[None]] = None
+
+        # created in start, event loop is not running yet
+        self._wakeup: asyncio.Event
+
+    @property
+    def _loop(self) -> asyncio.AbstractEventLoop:
+        return asyncio.get_event_loop()
+
+    def add(self, task: BaseTask) -> None:
+        if task.overrun not in OVERRUN_POLICIES:
+            raise ValueError(
+                f"{task.name}: unknown overrun policy {task.overrun}, "
+                f"expected one of {OVERRUN_POLICIES}"
+            )
+
+        # first run happens after interval, this gives supervisor tasks small buffer of
+        # time that lets them not flood Sentry with false errors while backend is booting
+        task._tick = self._loop.time() + task.interval
+
+        self._push(task)
+
+    def _push(self, task: BaseTask) -> None:
+        fire_at = task._tick
+        if task.jitter:
+            fire_at += random.uniform(0, task.jitter)
+
+        self._counter += 1
+        heapq.heappush(self._heap, (fire_at, self._counter, task))
+
+        # older heap entries of task become stale
+        task._entry = self._counter
+
+        if self._task is not None:
+            self._wakeup.set()
+
+    def reschedule(self, task: BaseTask) -> None:
+        """Apply new interval if it makes next run happen earlier."""
+
+        tick = self._loop.time() + task.interval
+        if tick >= task._tick:
+            return
+
+        task._tick = tick
+
+        self._push(task)
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = set(self._runs)
+        if self._task is not None:
+            tasks.add(self._task)
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+
+            if not self._heap:
+                await self._wakeup.wait()
+
+                continue
+
+            fire_at, entry, task = self._heap[0]
+
+            if entry != task._entry:
+                heapq.heappop(self._heap)
+
+                continue
+
+            delay = fire_at - self._loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            heapq.heappop(self._heap)
+
+            if self._fire(task) and task.long_running:
+                # pushed back when run ends
+                continue
+
+            self._advance(task)
+
+    def _advance(self, task: BaseTask) -> None:
+        task._tick += task.interval
+
+        # event loop was blocked or process suspended, do not try to catch up
+        now = self._loop.time()
+        if task._tick < now:
+            missed = int((now - task._tick) // task.interval) + 1
+            task._tick += missed * task.interval
+            task.metrics.missed_ticks += missed
+
+            log.warning(f"task {task.name} missed {missed} tick(s)")
+
+        self._push(task)
+
+    def _fire(self, task: BaseTask) -> bool:
+        """Start run unless policy forbids it, returns whether run was started."""
+
+        if task.singleton and not task.leader():
+            return False
+
+        if task._running and task.overrun != OVERRUN_CONCURRENT:
+            # ticks are coalesced, queue does not grow while run is stuck
+            if task.overrun == OVERRUN_QUEUE and task._queued < task.max_queued:
+                task._queued += 1
+            else:
+                task.metrics.skipped_ticks += 1
+
+            return False
+
+        self._spawn(task)
+
+        return True
+
+    def _spawn(self, task: BaseTask) -> None:
+        run = asyncio.create_task(self._execute(task))
+
+        self._runs.add(run)
+        run.add_done_callback(self._runs.discard)
+
+        task._runs.add(run)
+        run.add_done_callback(task._runs.discard)
+
+    async def cancel_runs(self, task: BaseTask) -> None:
+        runs = set(task._runs)
+        for run in runs:
+            run.cancel()
+
+        await asyncio.gather(*runs, return_exceptions=True)
+
+    async def _execute(self, task: BaseTask) -> None:
+        task._running += 1
+        try:
+            await task._run_once_safe()
+        finally:
+            task._running -= 1
+
+            if task.long_running:
+                task._tick = self._loop.time() + task.interval
+
+                self._push(task)
+
+        if task._queued:
+            task._queued -= 1
+
+            self._spawn(task)
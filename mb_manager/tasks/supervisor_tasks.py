@@ -1,11 +1,17 @@
+import time
+import asyncio
 import logging
 
+from typing import Any, Dict, List, Optional
+
 import aiohttp
 
 from aiohttp import web
 
 from .task import BaseTask
 from ..docker import Docker, DockerException
+from .metrics import LatencyWindow
+from ..rollout import WORKER_IMAGE_NAME, WorkerSlots, create_worker
 
 # add class into this list to enable task
 __all__ = (
@@ -15,109 +21,288 @@ __all__ = (
 
 log = logging.getLogger(__name__)
 
-WORKER_IMAGE_NAME = "modbay1/worker"
+LATENCY_WINDOW_SIZE = 256
+# percentiles of smaller windows are too noisy to alert on
+SLO_MIN_SAMPLES = 10
+
+# seconds, DockerSupervisor reconnect delay doubles up to this while docker fails
+MAX_RECONNECT_DELAY = 60
+
+
+class Endpoint:
+    """Probe state of single healthcheck url."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.streak = 0
+        self.slo_breached = False
+
+        self.latencies = LatencyWindow(LATENCY_WINDOW_SIZE)
+
+    def to_json(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.latencies.percentiles(50, 95, 99)
+
+        return dict(
+            url=self.url,
+            streak=self.streak,
+            slo_breached=self.slo_breached,
+            samples=len(self.latencies),
+            p50=p50,
+            p95=p95,
+            p99=p99,
+        )
 
 
 class HTTPSupervisor(BaseTask):
+    """
+    Probes worker healthcheck urls concurrently with adaptive interval.
+
+    Interval grows by multiplier up to ceiling while all endpoints are healthy and
+    drops to floor after first failure, so outage is confirmed or cleared quickly.
+    """
+
     interval = 60
     alert_at = 2
 
+    singleton = True
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # filled from config in setup, /status/probes is served before it
+        self.endpoints: List[Endpoint] = []
+
     async def setup(self, app: web.Application) -> None:
         await super().setup(app)
 
-        self._streak = 0
+        supervisor_config = app["config"]["supervisor"]
+        probe_config = supervisor_config["probe"]
+
+        self.endpoints = [
+            Endpoint(url)
+            for url in (supervisor_config["healthcheck_url"], *probe_config["urls"])
+        ]
+
+        # connections are kept alive between probes
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=probe_config["concurrency"]),
+            timeout=aiohttp.ClientTimeout(total=probe_config["timeout"]),
+        )
+        self._semaphore = asyncio.Semaphore(probe_config["concurrency"])
+
+        self._latency_slo = probe_config["latency_slo"]
 
-        self._session = aiohttp.ClientSession()
+        self._floor = probe_config["floor"]
+        self._ceiling = probe_config["ceiling"]
+        self._multiplier = probe_config["multiplier"]
 
-        self._healthcheck_url = app["config"]["supervisor"]["healthcheck_url"]
+        self.jitter = probe_config["jitter"]
+        self.interval = self._ceiling
 
     async def stop(self) -> None:
         await self._session.close()
 
     async def run_once(self) -> None:
-        try:
-            async with self._session.get(self._healthcheck_url) as r:
-                if r.status == 200:
-                    self._streak = 0
+        results = await asyncio.gather(*(self._probe(e) for e in self.endpoints))
+
+        if all(results):
+            if self.interval < self._ceiling:
+                self.set_interval(min(self.interval * self._multiplier, self._ceiling))
+        elif self.interval > self._floor:
+            self.set_interval(self._floor)
+
+    async def _probe(self, endpoint: Endpoint) -> bool:
+        async with self._semaphore:
+            started_at = time.monotonic()
+            try:
+                async with self._session.get(endpoint.url) as r:
+                    # response time without body
+                    endpoint.latencies.add(time.monotonic() - started_at)
+
+                    if r.status == 200:
+                        endpoint.streak = 0
+                        self._check_slo(endpoint)
+
+                        return True
+
+                    self.increase_streak(endpoint)
+
+                    if endpoint.streak >= self.alert_at:
+                        log.error(f"{r.method} {r.url}: {r.status}")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.increase_streak(endpoint)
+
+                if endpoint.streak >= self.alert_at:
+                    log.exception(f"service unreachable: {endpoint.url}")
+
+        return False
 
-                    return
+    def _check_slo(self, endpoint: Endpoint) -> None:
+        if len(endpoint.latencies) < SLO_MIN_SAMPLES:
+            return
 
-                self.increase_streak()
+        (p95,) = endpoint.latencies.percentiles(95)
+        assert p95 is not None
 
-                if self._streak >= self.alert_at:
-                    log.error(f"{r.method} {r.url}: {r.status}")
-        except aiohttp.ClientConnectionError:
-            self.increase_streak()
+        breached = p95 > self._latency_slo
+        if breached == endpoint.slo_breached:
+            return
 
-            if self._streak >= self.alert_at:
-                log.exception("service unreachable")
+        endpoint.slo_breached = breached
 
-    def increase_streak(self) -> None:
+        if breached:
+            log.error(
+                f"{endpoint.url}: p95 latency {p95:.3f}s exceeds {self._latency_slo}s"
+            )
+        else:
+            log.info(f"{endpoint.url}: p95 latency {p95:.3f}s is back within SLO")
+
+    def increase_streak(self, endpoint: Endpoint) -> None:
         """Used for Sentry breadcrumbs."""
 
-        self._streak += 1
+        endpoint.streak += 1
 
-        log.warning(f"subsequent {self.__class__.__name__} fail streak: {self._streak}")
+        log.warning(
+            f"subsequent {self.__class__.__name__} fail streak of {endpoint.url}: "
+            f"{endpoint.streak}"
+        )
 
 
 class DockerSupervisor(BaseTask):
-    interval = 5
+    """
+    Keeps active worker container alive.
+
+    Listens to docker events of worker containers and recreates active one as soon as
+    it is destroyed. Interval is used as reconnect delay in case event stream breaks,
+    it grows exponentially while docker or registry keeps failing.
+    """
+
+    interval = 1
+
+    singleton = True
+
+    # follows event stream until it breaks
+    long_running = True
+
+    # die is followed by destroy for AutoRemove containers
+    EVENTS = ("die", "destroy")
 
     async def setup(self, app: web.Application) -> None:
         await super().setup(app)
 
         self._app = app
         self._docker: Docker = app["docker"]
-        self._container_name = app["config"]["supervisor"]["worker_container_name"]
+        self._slots: WorkerSlots = app["worker_slots"]
+
+        # nanoseconds timestamp of latest processed event, used to resume stream
+        self._since: Optional[int] = None
+
+        self._reconnect_delay = self.interval
 
     async def run_once(self) -> None:
-        image_missing = False
+        try:
+            await self._follow_events()
+        except Exception:
+            self.interval = min(self.interval * 2, MAX_RECONNECT_DELAY)
+
+            raise
+
+    async def _follow_events(self) -> None:
+        # since is fixed before checking container state, events that happen between
+        # check and stream start are replayed by docker
+        if self._since is None:
+            self._since = time.time_ns()
+
+        events = await self._docker.events(
+            filters=dict(
+                type=["container"],
+                container=list(self._slots.names),
+                event=list(self.EVENTS),
+            ),
+            since=self._since,
+        )
+
+        await self._ensure_container()
+
+        # docker works again
+        self.interval = self._reconnect_delay
+
+        async for event in events:
+            event_time = event["timeNano"]
+
+            # since is inclusive, skip events that are replayed after reconnect
+            if event_time <= self._since:
+                continue
+
+            self._since = event_time
+
+            name = event["Actor"]["Attributes"]["name"]
+            action = event["Action"]
+
+            # previous container is stopped during blue/green rollout
+            if name != self._slots.active.name:
+                log.info(f"inactive container {name} event: {action}")
+
+                continue
+
+            log.warning(f"container {name} event: {action}")
+
+            if action == "destroy":
+                await self._recreate_container()
+            else:
+                await self._ensure_container()
+
+    async def _ensure_container(self) -> None:
+        name = self._slots.active.name
 
         try:
-            await self._docker.wait(self._container_name, condition="removed")
+            container = await self._docker.inspect(name)
         except DockerException as e:
-            if e.status == 404:
-                if "no such container" in str(e).lower():
-                    log.warning(
-                        f"container {self._container_name} does not exist, creating"
-                    )
-                else:
-                    image_missing = True
-            else:
-                log.exception("error waiting container")
+            if e.status != 404:
+                raise
+
+            log.warning(f"container {name} does not exist, creating")
+
+            await self._recreate_container()
+
+            return
+
+        state = container["State"]
+        if state["Running"]:
+            return
+
+        if container["HostConfig"]["AutoRemove"]:
+            # destroy event will follow
+            return
+
+        log.warning(f"container {name} is not running, starting")
+
+        # new leader could be handling the same container already
+        self.check_leader()
+
+        await self._docker.start(name)
+
+    async def _recreate_container(self) -> None:
+        self.check_leader()
 
         HTTPSupervisor.pause()
-        if image_missing:
-            log.warning("image does not exist, pulling and creating container")
-            await self._docker.pull(
-                f"{self._docker.registry_address}/{WORKER_IMAGE_NAME}",
-                registry_credentials=self._app["config"]["docker"]["registry"][
-                    "worker"
-                ],
-            )
+        try:
+            try:
+                await create_worker(self._docker, self._slots.active, self._slots.host)
+            except DockerException as e:
+                if e.status != 404:
+                    raise
 
-        await self._create_container()
-        HTTPSupervisor.unpause()
-
-    # TODO: move to Docker class
-    async def _create_container(self) -> None:
-        create_params = {"name": self._container_name}
-        create_body = {
-            "User": "root",  # TODO: do not use root?
-            "Cmd": ("-v", "debug"),
-            "Image": "registry.gitlab.com/modbay1/worker",
-            "HostConfig": {
-                "Binds": ("/home/modbay/worker_config.yaml:/code/config.yaml",),
-                "PortBindings": {
-                    "8080/tcp": ({"HostIp": "127.0.0.1", "HostPort": "8080"},)
-                },
-                "AutoRemove": True,
-            },
-        }
-
-        await self._docker.request(
-            "POST", "/containers/create", params=create_params, body=create_body
-        )
-        await self._docker.request(
-            "POST", f"/containers/{self._container_name}/start",
-        )
+                log.warning("image does not exist, pulling and creating container")
+                await self._docker.pull(
+                    f"{self._docker.registry_address}/{WORKER_IMAGE_NAME}",
+                    registry_credentials=self._app["config"]["docker"]["registry"][
+                        "worker"
+                    ],
+                )
+
+                self.check_leader()
+
+                await create_worker(self._docker, self._slots.active, self._slots.host)
+        finally:
+            HTTPSupervisor.unpause()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import abc
+import math
+import time
 import asyncio
 import logging
 
@@ -8,9 +10,16 @@ from typing import Any, Set, Dict, List, Type, Tuple, Optional
 
 from aiohttp import web
 
+from .metrics import TaskMetrics
+from .scheduler import OVERRUN_SKIP, Scheduler
+
 log = logging.getLogger(__name__)
 
 
+class LeadershipLost(Exception):
+    pass
+
+
 class Task(type):
     def __init__(cls: type, name: str, bases: Tuple[type, ...], dct: Dict[str, Any]):
         for base in cls.__mro__:
@@ -28,15 +37,57 @@ class BaseTask(metaclass=Task):
     _instance: BaseTask
     _instances: Set[BaseTask] = set()
 
-    interval: int
+    _scheduler = Scheduler()
+
+    # changed by leader election, see leader_tasks.LeaderLease
+    _leader = True
+    # monotonic time lease can expire at, leader steps down before it
+    _leader_until = math.inf
+    # fencing token of leader lease, None without leader election
+    _fencing_token: Optional[int] = None
+
+    interval: float
+
+    # only run in manager that holds leader lease
+    singleton = False
+
+    # random delay up to this number of seconds is added to every run
+    jitter: float = 0
+    # one of scheduler.OVERRUN_POLICIES
+    overrun: str = OVERRUN_SKIP
+    # ticks kept with OVERRUN_QUEUE policy, later ones are skipped
+    max_queued = 1
+    # run_once does not return until error, it is restarted interval after it ends
+    # instead of being run on ticks
+    long_running = False
 
     def __init__(self) -> None:
-        self._task: Optional[asyncio.Task[None]] = None
         self._cancelled = False
+        self._set_up = False
+
+        # scheduler state
+        self._tick = 0.0
+        self._entry = 0
+        self._running = 0
+        self._queued = 0
+        self._runs: Set[asyncio.Task[None]] = set()
+
+        self.metrics = TaskMetrics()
 
         # cannot be set here because aiohttp starts a thread that breaks asyncio
         self._unpaused: asyncio.Event
 
+    @property
+    def name(self) -> str:
+        return self.__class__.__name__
+
+    def set_interval(self, interval: float) -> None:
+        """Change interval. Next run is moved earlier if it is too far away."""
+
+        self.interval = interval
+
+        self._scheduler.reschedule(self)
+
     async def setup(self, app: web.Application) -> None:
         self._unpaused = asyncio.Event()
         self._unpaused.set()
@@ -60,6 +111,44 @@ class BaseTask(metaclass=Task):
 
         cls._get_instance()._unpaused.set()
 
+    @staticmethod
+    def leader() -> bool:
+        return BaseTask._leader and time.monotonic() < BaseTask._leader_until
+
+    @staticmethod
+    def fencing_token() -> Optional[int]:
+        return BaseTask._fencing_token
+
+    @staticmethod
+    def check_leader() -> None:
+        """Raise LeadershipLost if lease is lost. Call before side effects."""
+
+        if not BaseTask.leader():
+            raise LeadershipLost("leader lease is lost")
+
+    @staticmethod
+    async def set_leader(
+        leader: bool, token: Optional[int] = None, until: float = math.inf
+    ) -> None:
+        BaseTask._fencing_token = token if leader else None
+        BaseTask._leader_until = until if leader else 0
+
+        if leader == BaseTask._leader:
+            return
+
+        BaseTask._leader = leader
+
+        if leader:
+            log.info("became leader, starting singleton tasks")
+
+            return
+
+        log.warning("lost leadership, stopping singleton tasks")
+
+        for instance in BaseTask._instances:
+            if instance.singleton:
+                await BaseTask._scheduler.cancel_runs(instance)
+
     @staticmethod
     async def schedule_all(app: web.Application) -> None:
         log.info(f"scheduling {len(BaseTask._instances)} tasks")
@@ -67,24 +156,42 @@ class BaseTask(metaclass=Task):
         for instance in BaseTask._instances:
             await instance.schedule(app)
 
+        BaseTask._scheduler.start()
+
     async def schedule(self, app: web.Application) -> None:
         await self.setup(app)
 
-        self._task = asyncio.create_task(self._run_forever())
+        self._set_up = True
 
-    async def _run_forever(self) -> None:
-        while not self._cancelled:
-            # sleeping before task gives supervisor tasks small buffer of time that lets
-            # them not flood Sentry with false errors while backend is booting
-            await asyncio.sleep(self.interval)
+        # setup can disable task based on config
+        if self.interval == -1:
+            return
 
+        self._scheduler.add(self)
+
+    async def _run_once_safe(self) -> None:
+        if not self._unpaused.is_set():
+            paused_at = time.monotonic()
             await self._unpaused.wait()
+            self.metrics.paused_seconds += time.monotonic() - paused_at
+
+        log.debug("running task %s", self.name)
 
-            log.debug("running task %s", self.__class__.__name__)
-            try:
-                await self.run_once()
-            except Exception:
-                log.exception("error running task")
+        self.metrics.started()
+        started_at = time.monotonic()
+
+        try:
+            await self.run_once()
+        except Exception:
+            log.exception("error running task")
+
+            self.metrics.finished(
+                time.monotonic() - started_at, success=False, interval=self.interval
+            )
+        else:
+            self.metrics.finished(
+                time.monotonic() - started_at, success=True, interval=self.interval
+            )
 
     @abc.abstractmethod
     async def run_once(self) -> None:
@@ -94,16 +201,16 @@ class BaseTask(metaclass=Task):
     async def cancel_all(_: web.Application) -> None:
         log.info(f"cancelling {len(BaseTask._instances)} tasks")
 
+        await BaseTask._scheduler.stop()
+
         for instance in BaseTask._instances:
-            await instance.stop()
+            await instance.cancel()
 
     async def cancel(self) -> None:
-        if self._cancelled:
+        # startup could be interrupted before setup
+        if self._cancelled or not self._set_up:
             return
 
         self._cancelled = True
 
         await self.stop()
-
-        if self._task:
-            self._task.cancel()
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import sys
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+
+from array import array
+from types import TracebackType
+from typing import (
+    IO,
+    Any,
+    Dict,
+    List,
+    Type,
+    Tuple,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+)
+
+# File layout, all numbers are little endian:
+#
+#     MAGIC, u16 version
+#     column blocks of every table
+#     directory: JSON with tables, columns, block offsets and metadata
+#     u64 directory offset, u64 directory size, MAGIC
+#
+# Column block of INT is array of i64, BOOL is array of u8, STR and BYTES are
+# values prefixed with u32 length. Blocks are read through mmap without loading file.
+
+MAGIC = b"MBDS"
+VERSION = 1
+
+INT = "int"
+BOOL = "bool"
+STR = "str"
+BYTES = "bytes"
+
+_HEADER = struct.Struct("<4sH")
+_TRAILER = struct.Struct("<QQ4s")
+_LENGTH = struct.Struct("<I")
+
+# fixed size values are buffered before writing to temporary file
+_FLUSH_SIZE = 65536
+
+Column = Tuple[str, str]
+_Row = Tuple[Any, ...]
+
+
+class DatasetError(Exception):
+    pass
+
+
+class _ColumnWriter:
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+
+        self._file: IO[bytes] = tempfile.TemporaryFile()
+        self._buffer = array("q" if kind == INT else "B")
+
+    def append(self, value: Any) -> None:
+        if self.kind == STR:
+            self._write_prefixed(value.encode())
+        elif self.kind == BYTES:
+            self._write_prefixed(value)
+        else:
+            self._buffer.append(value)
+
+            if len(self._buffer) >= _FLUSH_SIZE:
+                self._flush()
+
+    def _write_prefixed(self, value: bytes) -> None:
+        self._file.write(_LENGTH.pack(len(value)))
+        self._file.write(value)
+
+    def _flush(self) -> None:
+        if sys.byteorder == "big":
+            self._buffer.byteswap()
+
+        self._file.write(self._buffer.tobytes())
+
+        del self._buffer[:]
+
+    def copy_to(self, out: IO[bytes]) -> int:
+        """Append column block to file, returns block size."""
+
+        self._flush()
+
+        size = self._file.tell()
+        self._file.seek(0)
+
+        shutil.copyfileobj(self._file, out)
+        self._file.close()
+
+        return size
+
+
+class TableWriter:
+    def __init__(self, name: str, columns: Sequence[Column]) -> None:
+        self.name = name
+        self.columns = columns
+        self.rows = 0
+
+        self._writers = [_ColumnWriter(kind) for _, kind in columns]
+
+    def append(self, rows: Iterable[_Row]) -> None:
+        for row in rows:
+            for writer, value in zip(self._writers, row):
+                writer.append(value)
+
+            self.rows += 1
+
+    def copy_to(self, out: IO[bytes]) -> Dict[str, Any]:
+        """Append column blocks to file, returns directory entry of table."""
+
+        columns = []
+        for (name, kind), writer in zip(self.columns, self._writers):
+            offset = out.tell()
+            size = writer.copy_to(out)
+
+            columns.append(dict(name=name, kind=kind, offset=offset, size=size))
+
+        return dict(rows=self.rows, columns=columns)
+
+
+class DatasetWriter:
+    """
+    Writes tables column by column.
+
+    Rows are spread over temporary file per column while table is written, so memory
+    use does not depend on number of rows.
+    """
+
+    def __init__(self, path: str, meta: Dict[str, Any]) -> None:
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+
+        self._meta = meta
+        self._tables: Dict[str, Any] = {}
+
+    def table(self, name: str, columns: Sequence[Column]) -> TableWriter:
+        return TableWriter(name, columns)
+
+    def write(self, table: TableWriter) -> None:
+        self._tables[table.name] = table.copy_to(self._file)
+
+    def close(self) -> None:
+        directory = json.dumps(dict(meta=self._meta, tables=self._tables)).encode()
+
+        offset = self._file.tell()
+        self._file.write(directory)
+        self._file.write(_TRAILER.pack(offset, len(directory), MAGIC))
+
+        self._file.close()
+
+    def __enter__(self) -> DatasetWriter:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if exc is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+class DatasetReader:
+    """
+    Reads tables written by DatasetWriter lazily through mmap.
+
+    Row iterators stop working after close.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                directory = self._read_directory(path)
+            except BaseException:
+                self._mmap.close()
+
+                raise
+        except BaseException:
+            self._file.close()
+
+            raise
+
+        self.meta: Dict[str, Any] = directory["meta"]
+        self._tables: Dict[str, Any] = directory["tables"]
+
+        # mmap cannot be closed while views of it exist, iterators can outlive reader
+        # if exception traceback holds them
+        self._views: List[memoryview[Any]] = []
+
+    def _read_directory(self, path: str) -> Any:
+        magic, version = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise DatasetError(f"{path} is not a dataset of version {VERSION}")
+
+        offset, size, magic = _TRAILER.unpack_from(
+            self._mmap, len(self._mmap) - _TRAILER.size
+        )
+        if magic != MAGIC:
+            raise DatasetError(f"{path} is truncated")
+
+        return json.loads(self._mmap[offset : offset + size])
+
+    def count(self, table: str) -> int:
+        rows: int = self._tables[table]["rows"]
+
+        return rows
+
+    def rows(self, table: str) -> Iterator[_Row]:
+        columns = [self._column(column) for column in self._tables[table]["columns"]]
+
+        return zip(*columns)
+
+    def _column(self, column: Dict[str, Any]) -> Iterator[Any]:
+        kind = column["kind"]
+        start = column["offset"]
+        end = start + column["size"]
+
+        block = self._track(memoryview(self._mmap)[start:end])
+
+        if kind in (STR, BYTES):
+            return self._prefixed(block, kind == STR)
+
+        if kind == INT and sys.byteorder == "big":
+            values = array("q")
+            values.frombytes(block)
+            values.byteswap()
+
+            return iter(values)
+
+        return iter(self._track(block.cast("q" if kind == INT else "?")))
+
+    def _track(self, view: memoryview[Any]) -> memoryview[Any]:
+        self._views.append(view)
+
+        return view
+
+    @staticmethod
+    def _prefixed(block: memoryview, decode: bool) -> Iterator[Any]:
+        position = 0
+        while position < len(block):
+            (length,) = _LENGTH.unpack_from(block, position)
+            position += _LENGTH.size
+
+            value = bytes(block[position : position + length])
+            position += length
+
+            yield value.decode() if decode else value
+
+    def close(self) -> None:
+        # casts are released before blocks they are made of
+        for view in reversed(self._views):
+            view.release()
+
+        self._views.clear()
+
+        self._mmap.close()
+        self._file.close()
@@ -2,17 +2,35 @@ from __future__ import annotations
 
 import os
 import sys
+import math
+import time
 import uuid
 import random
+import asyncio
 import logging
-
-from typing import Any, Dict, List, Optional, Sequence
-from dataclasses import dataclass
+import itertools
+
+from array import array
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+    Union,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    Awaitable,
+)
+from dataclasses import field, asdict, dataclass
+from concurrent.futures import Executor, ProcessPoolExecutor
 
 import edgedb
 
-from mb_backend.config import Config
-from mb_backend.security import _make_hash
+from ..config import Config
+from .dataset import INT, STR, BOOL, BYTES, Column, DatasetReader, DatasetWriter
 
 log = logging.getLogger(__name__)
 
@@ -23,67 +41,189 @@ TOTAL_COMMENTS = 400
 TOTAL_USERS = 200
 TOTAL_TEAMS = 20
 
+# deepest reply level, root comments have depth 0
+THREAD_DEPTH = 10
+# mean number of replies to every comment, fraction of replies with unlimited depth
+THREAD_FANOUT = 0.7
+
+# rows inserted by single query
+DEFAULT_BATCH_SIZE = 500
+# pool connections, batches of single stage are inserted concurrently
+DEFAULT_CONCURRENCY = 8
+
+# only this many lines are read from every sample file, samples are reused
+MAX_SAMPLES = 10_000
+
 COMMET_BODIES_FILE = f"{SAMPLES_FOLDER}/comments/bodies"
 USER_EMAILS_FILE = f"{SAMPLES_FOLDER}/users/emails"
 USER_NICKNAMES_FILE = f"{SAMPLES_FOLDER}/users/nicknames"
 USER_BIOS_FILE = f"{SAMPLES_FOLDER}/users/bios"
 TEAM_NAMES_FILE = f"{SAMPLES_FOLDER}/teams/names"
 
+QUALIFIED_NAME_MAX_LEN = 12
+
+NIL_ID = uuid.UUID(int=0)
+
+# Dataset tables in insertion order. Objects are referenced by their index in table,
+# -1 is no object.
+TABLES: Dict[str, Sequence[Column]] = {
+    "users": (
+        ("nickname", STR),
+        ("email", STR),
+        ("email_verified", BOOL),
+        ("avatar", STR),
+        # plaintext when generated, hash in dataset files
+        ("password", BYTES),
+        ("bio", STR),
+    ),
+    "teams": (("name", STR), ("avatar", STR)),
+    "team_members": (("team", INT), ("user", INT)),
+    "articles": (
+        ("author", INT),
+        ("team", INT),
+        ("rating", INT),
+        ("state", STR),
+        ("language", STR),
+    ),
+    "comments": (
+        ("author", INT),
+        ("article", INT),
+        ("parent", INT),
+        ("rating", INT),
+        ("body", STR),
+        ("deleted", BOOL),
+    ),
+}
+
+PASSWORD_COLUMN = 4
+
+_Row = Tuple[Any, ...]
+
 
 @dataclass
-class User:
-    nickname: str
-    email: str
-    email_verified: bool
-    avatar: str
-    password: bytes
-    bio: str
+class Options:
+    users: int = TOTAL_USERS
+    teams: int = TOTAL_TEAMS
+    articles: int = TOTAL_ARTICLES
+    comments: int = TOTAL_COMMENTS
 
+    thread_depth: int = THREAD_DEPTH
+    thread_fanout: float = THREAD_FANOUT
 
-@dataclass
-class Team:
-    name: str
-    avatar: str
-    members: List[User]
+    # same seed and options generate same dataset, random seed is logged when None
+    seed: Optional[int] = None
+
+    # write generated dataset into file instead of database
+    export_path: Optional[str] = None
+    # insert dataset from file instead of generating it
+    import_path: Optional[str] = None
+
+    batch_size: int = DEFAULT_BATCH_SIZE
+    concurrency: int = DEFAULT_CONCURRENCY
+
+    # password hashing is deliberately slow, it runs on all cores
+    hash_processes: int = field(default_factory=lambda: os.cpu_count() or 1)
 
 
 @dataclass
-class Article:
-    author: User
-    team: Optional[Team]
-    rating: int
-    state: str
-    language: str
+class Samples:
+    nicknames: Sequence[str]
+    emails: Sequence[str]
+    bios: Sequence[str]
+    team_names: Sequence[str]
+    comment_bodies: Sequence[str]
+
+    @classmethod
+    def load(cls) -> Samples:
+        return cls(
+            nicknames=_read_lines(USER_NICKNAMES_FILE),
+            emails=_read_lines(USER_EMAILS_FILE),
+            bios=_read_lines(USER_BIOS_FILE),
+            team_names=_read_lines(TEAM_NAMES_FILE),
+            comment_bodies=_read_lines(COMMET_BODIES_FILE),
+        )
 
-    # required for hashing
-    index__: int
 
-    def __hash__(self) -> int:
-        return hash(self.index__)
+class IdMap:
+    """Object ids by generation index, packed into 16 bytes per object."""
 
+    def __init__(self, size: int) -> None:
+        self._data = bytearray(16 * size)
+
+    def __setitem__(self, index: int, value: uuid.UUID) -> None:
+        self._data[16 * index : 16 * (index + 1)] = value.bytes
+
+    def __getitem__(self, index: int) -> uuid.UUID:
+        return uuid.UUID(bytes=bytes(self._data[16 * index : 16 * (index + 1)]))
+
+    def store(self, results: Sequence[Tuple[uuid.UUID, int]]) -> None:
+        """Store (id, index) pairs returned by insert query."""
+
+        for id_, index in results:
+            self[index] = id_
 
-@dataclass
-class Comment:
-    author: User
-    article: Article
-    parent: Optional[Comment]
-    rating: int
-    body: str
-    deleted: bool
 
+def _load_make_hash() -> Callable[[str], bytes]:
+    """Backend password hash function, users can only log in with its hashes."""
 
-users = []
-teams = []
-articles = []
-comments: List[Comment] = []
+    try:
+        from mb_backend.security import _make_hash
+    except ImportError:
+        log.fatal("mb_backend package is required to hash passwords of generated users")
+        log.fatal("Use --import-dataset with dataset exported where it is installed")
+
+        sys.exit(1)
+
+    make_hash: Callable[[str], bytes] = _make_hash
+
+    return make_hash
+
+
+class PasswordHasher:
+    """Hashes password column of user rows in parallel."""
+
+    def __init__(self, executor: Executor, make_hash: Callable[[str], bytes]) -> None:
+        self._executor = executor
+        self._make_hash = make_hash
+        # passwords are sample nicknames, most of them repeat
+        self._hashes: Dict[bytes, bytes] = {}
+
+    async def hash(self, batch: List[_Row]) -> List[_Row]:
+        """Replace plaintext passwords with hashes, new ones are hashed in parallel."""
+
+        i = PASSWORD_COLUMN
+
+        missing = list({row[i] for row in batch} - self._hashes.keys())
+
+        loop = asyncio.get_running_loop()
+        hashes = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, self._make_hash, password.decode())
+                for password in missing
+            )
+        )
+        self._hashes.update(zip(missing, hashes))
 
-article_to_comments_map: Dict[Article, List[Comment]] = {}
+        return [(*row[:i], self._hashes[row[i]], *row[i + 1 :]) for row in batch]
 
-articles_by_id = {}
-comments_by_id = {}
 
+async def populate_db(config: Config, options: Optional[Options] = None) -> None:
+    if options is None:
+        options = Options()
+
+    if options.import_path is not None:
+        log.info(f"reading dataset from {options.import_path}")
+        reader = DatasetReader(options.import_path)
+        try:
+            log.info(f"dataset was generated with {reader.meta}")
+
+            # passwords in dataset files are already hashed
+            await _seed(config, options, reader, None)
+        finally:
+            reader.close()
+
+        return
 
-def populate_db(config: Config) -> None:
     if not os.path.exists(SAMPLES_FOLDER):
         log.fatal(
             f"{SAMPLES_FOLDER} folder does not exist. Use scripts/populate_fake_data.py"
@@ -93,261 +233,518 @@ def populate_db(config: Config) -> None:
 
         sys.exit(1)
 
-    con = None
+    seed = options.seed
+    if seed is None:
+        seed = random.randrange(2**32)
+
+    make_hash = _load_make_hash()
+
+    log.info(f"generating dataset with seed {seed}")
+    generator = DatasetGenerator(options, Samples.load(), seed)
+
+    with ProcessPoolExecutor(max_workers=options.hash_processes) as executor:
+        hasher = PasswordHasher(executor, make_hash)
+
+        if options.export_path is not None:
+            await export_dataset(generator, hasher, options.export_path, options)
+        else:
+            await _seed(config, options, generator, hasher)
+
+
+async def _seed(
+    config: Config,
+    options: Options,
+    dataset: Union[DatasetGenerator, DatasetReader],
+    hasher: Optional[PasswordHasher],
+) -> None:
+    log.info("connecting to edgedb")
+    pool = await edgedb.create_async_pool(
+        **config["edgedb"], min_size=options.concurrency, max_size=options.concurrency
+    )
     try:
-        log.info("connecting to edgedb")
-        con = edgedb.connect(**config["edgedb"])
-        _populate(con)
+        await Seeder(pool, options, dataset, hasher).run()
     finally:
-        if con is not None:
-            log.info("closing edgedb connection")
-            con.close()
+        log.info("closing edgedb pool")
+        await pool.aclose()
+
+
+async def export_dataset(
+    dataset: DatasetGenerator, hasher: PasswordHasher, path: str, options: Options
+) -> None:
+    """Write generated dataset into file with hashed passwords."""
+
+    meta = dict(
+        seed=dataset.seed,
+        options={
+            name: value
+            for name, value in asdict(options).items()
+            if name in ("users", "teams", "articles", "comments")
+            or name.startswith("thread_")
+        },
+    )
+
+    with DatasetWriter(path, meta) as writer:
+        for name, columns in TABLES.items():
+            log.info(f"exporting {name}")
+
+            started_at = time.monotonic()
+
+            table = writer.table(name, columns)
+            for chunk in _chunks(dataset.rows(name), options.batch_size):
+                if name == "users":
+                    chunk = await hasher.hash(chunk)
+
+                table.append(chunk)
+
+            writer.write(table)
+
+            elapsed = time.monotonic() - started_at
+
+            log.info(
+                f"exported {table.rows} {name} in {elapsed:.2f}s, "
+                f"{table.rows / elapsed if elapsed else 0:.0f} rows/s"
+            )
+
+    log.info(f"dataset written to {path}")
 
 
 def _read_lines(filename: str) -> Sequence[str]:
     with open(filename, "r") as f:
-        return f.read().splitlines()
+        return [line.rstrip("\n") for line in itertools.islice(f, MAX_SAMPLES)]
 
 
-def _choose_random_items(
-    collection: Sequence[Any], count: int, unique: bool = False
-) -> Sequence[Any]:
-    if not unique:
-        return random.choices(collection, k=count)
+def _base36(number: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
 
-    if count > len(collection):
-        raise ValueError(
-            f"Not enough samples in collection to pick {count} random items"
-        )
+    result = ""
+    while True:
+        number, remainder = divmod(number, 36)
+        result = digits[remainder] + result
 
-    return random.sample(collection, count)
+        if not number:
+            return result
 
 
-def _populate(con: edgedb.BlockingIOConnection) -> None:
-    _populate_users(con)
-    _populate_teams(con)
-    _populate_articles(con)
-    _populate_comments(con)
+def _qualified_name(sample: str, index: int) -> str:
+    """Unique lowercase name made of sample prefix and index."""
 
-    _assign_teams_to_articles()
-    _assign_users_to_teams()
-    _assign_comments_to_articles()
+    suffix = _base36(index)
+    # suffix has no dashes, so names with different suffixes never match
+    prefix = sample[: QUALIFIED_NAME_MAX_LEN - len(suffix) - 1].rstrip("-")
 
-    # TODO: find a way to optimize these with bulk inserts
-    _insert_users(con)
-    _insert_teams(con)
-    _insert_articles(con)
-    _insert_comments(con)
+    return f"{prefix}-{suffix}".lower()
 
-    _update_comment_parents(con)
 
+def _chunks(rows: Iterable[_Row], size: int) -> Iterator[List[_Row]]:
+    iterator = iter(rows)
 
-def _populate_users(con: edgedb.BlockingIOConnection) -> None:
-    available_nicknames = _read_lines(USER_NICKNAMES_FILE)
-    available_emails = _read_lines(USER_EMAILS_FILE)
-    available_bios = _read_lines(USER_BIOS_FILE)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
 
-    nicknames = _choose_random_items(available_nicknames, TOTAL_USERS, unique=True)
-    emails = _choose_random_items(available_emails, TOTAL_USERS, unique=True)
-    bios = _choose_random_items(available_bios, TOTAL_USERS)
+        yield chunk
 
-    for i in range(TOTAL_USERS):
-        users.append(
-            User(
-                nickname=nicknames[i],
-                email=emails[i],
-                email_verified=True,
-                avatar="/dev/null",
-                password=_make_hash(nicknames[i]),
-                bio=bios[i],
-            )
-        )
 
+class DatasetGenerator:
+    """
+    Generates rows of TABLES lazily.
 
-def _populate_teams(con: edgedb.BlockingIOConnection) -> None:
-    available_names = _read_lines(TEAM_NAMES_FILE)
+    Every table has its own random generator seeded with seed and table name, so
+    rows do not depend on order tables are read in and can be generated again.
+    """
 
-    names = _choose_random_items(available_names, TOTAL_TEAMS, unique=True)
+    def __init__(self, options: Options, samples: Samples, seed: int) -> None:
+        self.seed = seed
 
-    for i in range(TOTAL_TEAMS):
-        teams.append(Team(name=names[i], avatar="/dev/null", members=[]))
+        self._options = options
+        self._samples = samples
 
+    def count(self, table: str) -> int:
+        if table == "team_members":
+            return sum(1 for _ in self.rows(table))
 
-def _populate_articles(con: edgedb.BlockingIOConnection) -> None:
-    for i in range(TOTAL_ARTICLES):
-        articles.append(
-            Article(
-                author=random.choice(users),
-                team=None,
-                rating=random.randrange(-10, 10),
-                state=random.choice(("draft", "hidden", "published")),
-                language=random.choice(("en", "ru")),
-                index__=i,
-            )
+        count: int = getattr(self._options, table)
+
+        return count
+
+    def rows(self, table: str) -> Iterator[_Row]:
+        rng = random.Random(f"{self.seed}:{table}")
+
+        generate: Callable[[random.Random], Iterator[_Row]] = getattr(
+            self, f"_generate_{table}"
         )
 
+        return generate(rng)
+
+    def _generate_users(self, rng: random.Random) -> Iterator[_Row]:
+        """Password is plaintext sample nickname is made of."""
 
-def _populate_comments(con: edgedb.BlockingIOConnection) -> None:
-    available_bodies = _read_lines(COMMET_BODIES_FILE)
+        nicknames = self._samples.nicknames
+        emails = self._samples.emails
 
-    bodies = _choose_random_items(available_bodies, TOTAL_COMMENTS)
+        for i in range(self._options.users):
+            nickname = nicknames[i % len(nicknames)]
 
-    for i in range(TOTAL_COMMENTS):
-        comments.append(
-            Comment(
-                author=random.choice(users),
-                article=random.choice(articles),
-                parent=None,
-                rating=random.randrange(-100, 100),
-                body=bodies[i],
-                deleted=random.random() > 0.5,
+            yield (
+                _qualified_name(nickname, i),
+                f"{_base36(i)}.{emails[i % len(emails)]}",
+                True,
+                "/dev/null",
+                nickname.encode(),
+                rng.choice(self._samples.bios),
             )
-        )
 
+    def _generate_teams(self, rng: random.Random) -> Iterator[_Row]:
+        names = self._samples.team_names
+
+        for i in range(self._options.teams):
+            yield (_qualified_name(names[i % len(names)], i), "/dev/null")
 
-def _assign_teams_to_articles() -> None:
-    """Sets random team for half of articles."""
+    def _generate_team_members(self, rng: random.Random) -> Iterator[_Row]:
+        """Adds users to random teams with 50% chance."""
+
+        for i in range(self._options.users):
+            if rng.random() > 0.5:
+                yield (rng.randrange(self._options.teams), i)
+
+    def _generate_articles(self, rng: random.Random) -> Iterator[_Row]:
+        for _ in range(self._options.articles):
+            # half of articles have team
+            team = rng.randrange(self._options.teams) if rng.random() > 0.5 else -1
+
+            yield (
+                rng.randrange(self._options.users),
+                team,
+                rng.randrange(-10, 10),
+                rng.choice(("draft", "hidden", "published")),
+                rng.choice(("en", "ru")),
+            )
 
-    for article in articles[: len(articles) // 2]:
-        article.team = random.choice(teams)
+    def _replies(self, rng: random.Random) -> int:
+        """Geometrically distributed number of replies with mean of thread_fanout."""
 
+        fanout = self._options.thread_fanout
+        if fanout <= 0:
+            return 0
 
-def _assign_users_to_teams() -> None:
-    """Adds users to random teams with 50% chance."""
+        return int(math.log(1 - rng.random()) / math.log(fanout / (1 + fanout)))
 
-    for user in users:
-        if random.random() > 0.5:
-            random.choice(teams).members.append(user)
+    def _generate_threads(self, rng: random.Random) -> Iterator[Tuple[int, int]]:
+        """
+        Yields parent index and article index of every comment.
 
+        Threads are generated depth first until there are enough comments. Only
+        replies of single thread are kept in memory.
+        """
+
+        index = 0
+        while index < self._options.comments:
+            article = rng.randrange(self._options.articles)
+
+            # parent index and depth of comments to generate
+            pending = [(-1, 0)]
+            while pending and index < self._options.comments:
+                parent, depth = pending.pop()
+
+                yield parent, article
+
+                if depth < self._options.thread_depth:
+                    pending.extend(
+                        (index, depth + 1) for _ in range(self._replies(rng))
+                    )
+
+                index += 1
+
+    def _generate_comments(self, rng: random.Random) -> Iterator[_Row]:
+        for parent, article in self._generate_threads(rng):
+            yield (
+                rng.randrange(self._options.users),
+                article,
+                parent,
+                rng.randrange(-100, 100),
+                rng.choice(self._samples.comment_bodies),
+                rng.random() > 0.5,
+            )
 
-def _assign_comments_to_articles() -> None:
+
+class Seeder:
     """
-    Assigns random article to comments, with 70% chance adds random comment from article
-    as parent.
+    Inserts dataset rows chunk by chunk.
+
+    Inserts return ids with index of every object. Ids are kept in IdMaps, so
+    indexes in dataset are resolved into ids without searching referenced objects.
     """
 
-    for comment in comments:
-        article = random.choice(articles)
-        comment.article = article
+    def __init__(
+        self,
+        pool: edgedb.AsyncIOPool,
+        options: Options,
+        dataset: Union[DatasetGenerator, DatasetReader],
+        hasher: Optional[PasswordHasher],
+    ) -> None:
+        self._pool = pool
+        self._options = options
+        self._dataset = dataset
+        self._hasher = hasher
+
+        self._user_ids = IdMap(dataset.count("users"))
+        self._team_ids = IdMap(dataset.count("teams"))
+        self._article_ids = IdMap(dataset.count("articles"))
+        self._comment_ids = IdMap(dataset.count("comments"))
+
+        # parent index of every comment, -1 for root comments
+        self._comment_parents = array("q", [-1]) * dataset.count("comments")
+
+    async def run(self) -> None:
+        # every stage references objects inserted by previous ones
+        for name, insert in (
+            ("users", self._insert_users),
+            ("teams", self._insert_teams),
+            ("team members", self._insert_team_members),
+            ("articles", self._insert_articles),
+            ("comments", self._insert_comments),
+            ("comment parents", self._update_comment_parents),
+        ):
+            log.info(f"inserting {name}")
+
+            started_at = time.monotonic()
+            rows = await insert()
+            elapsed = time.monotonic() - started_at
+
+            log.info(
+                f"inserted {rows} {name} in {elapsed:.2f}s, "
+                f"{rows / elapsed if elapsed else 0:.0f} rows/s"
+            )
 
-        if article in article_to_comments_map:
-            if random.random() > 0.3:
-                comment.parent = random.choice(article_to_comments_map[article])
+    async def _insert_batches(
+        self,
+        query: str,
+        rows: Iterable[_Row],
+        prepare: Optional[Callable[[List[_Row]], Awaitable[List[_Row]]]] = None,
+        on_inserted: Optional[Callable[[Sequence[Any]], None]] = None,
+        concurrency: Optional[int] = None,
+    ) -> int:
+        """
+        Run query with $rows argument for every batch, each in separate transaction.
 
-            article_to_comments_map[article].append(comment)
-        else:
-            article_to_comments_map[article] = [comment]
+        Batch is generated only when connection is free to insert it, number of rows
+        in memory does not depend on total number of rows. Next batch is prepared while
+        previous ones are inserted.
+        """
+
+        if concurrency is None:
+            concurrency = self._options.concurrency
+
+        queue: asyncio.Queue[Optional[List[_Row]]] = asyncio.Queue(concurrency)
+        inserted = 0
+
+        async def produce() -> None:
+            for batch in _chunks(rows, self._options.batch_size):
+                if prepare is not None:
+                    batch = await prepare(batch)
+
+                await queue.put(batch)
+
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        async def insert() -> None:
+            nonlocal inserted
+
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+
+                async with self._pool.acquire() as con:
+                    async with con.transaction():
+                        results = await con.fetchall(query, rows=batch)
+
+                if on_inserted is not None:
+                    on_inserted(results)
+
+                inserted += len(batch)
 
+        tasks = [
+            asyncio.create_task(produce()),
+            *(asyncio.create_task(insert()) for _ in range(concurrency)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # producer would wait forever if inserts fail
+            for task in tasks:
+                task.cancel()
 
-def _insert_users(con: edgedb.BlockingIOConnection) -> None:
-    log.info("inserting users")
+        return inserted
 
-    for user in users:
-        con.fetchone(
+    def _indexed(self, table: str) -> Iterator[_Row]:
+        return ((i, *row) for i, row in enumerate(self._dataset.rows(table)))
+
+    async def _hash_passwords(self, batch: List[_Row]) -> List[_Row]:
+        assert self._hasher is not None
+
+        # index column shifts password by one
+        hashed = await self._hasher.hash([row[1:] for row in batch])
+
+        return [(row[0], *hashed_row) for row, hashed_row in zip(batch, hashed)]
+
+    async def _insert_users(self) -> int:
+        # results of FOR are not ordered, index is returned to match ids with objects
+        return await self._insert_batches(
             """
-            INSERT User {
-                nickname := <str>$nickname,
-                email := <str>$email,
-                email_verified := <bool>$email_verified,
-                avatar := <str>$avatar,
-                password := <bytes>$password,
-                bio := <str>$bio,
+            FOR user IN {
+                array_unpack(
+                    <array<tuple<int64, str, str, bool, str, bytes, str>>>$rows
+                )
             }
+            UNION (
+                (
+                    INSERT User {
+                        nickname := user.1,
+                        email := user.2,
+                        email_verified := user.3,
+                        avatar := user.4,
+                        password := user.5,
+                        bio := user.6,
+                    }
+                ).id,
+                user.0,
+            )
             """,
-            nickname=user.nickname,
-            email=user.email,
-            email_verified=user.email_verified,
-            avatar=user.avatar,
-            password=user.password,
-            bio=user.bio,
+            self._indexed("users"),
+            prepare=None if self._hasher is None else self._hash_passwords,
+            on_inserted=self._user_ids.store,
         )
 
-
-def _insert_teams(con: edgedb.BlockingIOConnection) -> None:
-    log.info("inserting teams")
-
-    for team in teams:
-        con.fetchone(
+    async def _insert_teams(self) -> int:
+        return await self._insert_batches(
             """
-            INSERT Team {
-                name := <str>$name,
-                avatar := <str>$avatar,
-                members := (
-                    FOR nickname IN {array_unpack(<array<str>>$members)}
-                    UNION {
-                        (
-                            SELECT User
-                            FILTER str_lower(.nickname) = nickname
-                        )
+            FOR team IN {array_unpack(<array<tuple<int64, str, str>>>$rows)}
+            UNION (
+                (
+                    INSERT Team {
+                        name := team.1,
+                        avatar := team.2,
                     }
-                ),
-            }
+                ).id,
+                team.0,
+            )
             """,
-            name=team.name,
-            avatar=team.avatar,
-            members=[m.nickname.lower() for m in team.members],
+            self._indexed("teams"),
+            on_inserted=self._team_ids.store,
         )
 
+    def _team_members(self) -> Iterator[_Row]:
+        for team, user in self._dataset.rows("team_members"):
+            yield (self._team_ids[team], self._user_ids[user])
+
+    async def _insert_team_members(self) -> int:
+        return await self._insert_batches(
+            """
+            WITH memberships := array_unpack(<array<tuple<uuid, uuid>>>$rows)
+            FOR team_id IN {DISTINCT memberships.0}
+            UNION (
+                UPDATE Team
+                FILTER .id = team_id
+                SET {
+                    members += (
+                        SELECT User
+                        FILTER .id IN (
+                            SELECT memberships FILTER memberships.0 = team_id
+                        ).1
+                    )
+                }
+            )
+            """,
+            self._team_members(),
+            # concurrent batches would update same teams and conflict
+            concurrency=1,
+        )
 
-def _insert_articles(con: edgedb.BlockingIOConnection) -> None:
-    log.info("inserting articles")
+    def _articles(self) -> Iterator[_Row]:
+        for i, (author, team, *rest) in enumerate(self._dataset.rows("articles")):
+            # nil id matches no team
+            yield (
+                i,
+                self._user_ids[author],
+                self._team_ids[team] if team != -1 else NIL_ID,
+                *rest,
+            )
 
-    for article in articles:
-        article_id = con.fetchone(
+    async def _insert_articles(self) -> int:
+        return await self._insert_batches(
             """
-            INSERT Article {
-                author := (
-                    SELECT User
-                    FILTER str_lower(.nickname) = <str>$author_nickname
-                    LIMIT 1
-                ),
-                team := (
-                    SELECT Team
-                    FILTER str_lower(.name) = <str>$team_name
-                    LIMIT 1
-                ),
-                rating := <int16>$rating,
-                state := <str>$state,
-                language := <str>$language,
+            FOR article IN {
+                array_unpack(<array<tuple<int64, uuid, uuid, int16, str, str>>>$rows)
             }
+            UNION (
+                (
+                    INSERT Article {
+                        author := (SELECT User FILTER .id = article.1),
+                        team := (SELECT Team FILTER .id = article.2),
+                        rating := article.3,
+                        state := <article_state_enum>article.4,
+                        language := article.5,
+                    }
+                ).id,
+                article.0,
+            )
             """,
-            author_nickname=article.author.nickname.lower(),
-            team_name=article.team.name if article.team else "",
-            rating=article.rating,
-            state=article.state,
-            language=article.language,
+            self._articles(),
+            on_inserted=self._article_ids.store,
         )
 
+    def _comments(self) -> Iterator[_Row]:
+        """Parents are linked by _update_comment_parents once all comments exist."""
 
-def _insert_comments(con: edgedb.BlockingIOConnection) -> None:
-    log.info("inserting comments")
+        for i, (author, article, parent, *rest) in enumerate(
+            self._dataset.rows("comments")
+        ):
+            self._comment_parents[i] = parent
 
-    for comment in comments:
-        comment_id = con.fetchone(
+            yield (i, self._user_ids[author], self._article_ids[article], *rest)
+
+    async def _insert_comments(self) -> int:
+        return await self._insert_batches(
             """
-            INSERT Comment {
-                author := (
-                    SELECT User
-                    FILTER str_lower(.nickname) = <str>$author_nickname
-                    LIMIT 1
-                ),
-                article := (
-                    SELECT Article
-                    FILTER .id = <str>$article_id
-                    LIMIT 1
-                ),
-                rating := <int16>$rating,
-                body := <str>$body,
-                deleted := <bool>$deleted,
+            FOR comment IN {
+                array_unpack(<array<tuple<int64, uuid, uuid, int16, str, bool>>>$rows)
             }
-            """
+            UNION (
+                (
+                    INSERT Comment {
+                        author := (SELECT User FILTER .id = comment.1),
+                        article := (SELECT Article FILTER .id = comment.2),
+                        rating := comment.3,
+                        body := comment.4,
+                        deleted := comment.5,
+                    }
+                ).id,
+                comment.0,
+            )
+            """,
+            self._comments(),
+            on_inserted=self._comment_ids.store,
         )
-        comments_by_id[comment_id] = comment
 
+    def _comment_parent_links(self) -> Iterator[_Row]:
+        for index, parent in enumerate(self._comment_parents):
+            if parent != -1:
+                yield (self._comment_ids[index], self._comment_ids[parent])
 
-def _update_comment_parents(con: edgedb.BlockingIOConnection) -> None:
-
-    # def update(comment: Comment) -> None:
-    #     if
-    # TODO
-    pass
+    async def _update_comment_parents(self) -> int:
+        return await self._insert_batches(
+            """
+            FOR link IN {array_unpack(<array<tuple<uuid, uuid>>>$rows)}
+            UNION (
+                UPDATE Comment
+                FILTER .id = link.0
+                SET {
+                    parent := (SELECT DETACHED Comment FILTER .id = link.1)
+                }
+            )
+            """,
+            self._comment_parent_links(),
+        )
@@ -0,0 +1,94 @@
+import pytest
+
+from mb_manager.utils import dataset
+from mb_manager.utils.dataset import (
+    INT,
+    STR,
+    BOOL,
+    BYTES,
+    DatasetError,
+    DatasetReader,
+    DatasetWriter,
+)
+
+COLUMNS = (("number", INT), ("flag", BOOL), ("text", STR), ("data", BYTES))
+
+ROWS = [(i - 5, i % 2 == 0, f"row {i} ✓", bytes([i]) * i) for i in range(10)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "dataset")
+
+    with DatasetWriter(path, dict(seed=42)) as writer:
+        table = writer.table("rows", COLUMNS)
+        table.append(ROWS)
+        writer.write(table)
+
+    return path
+
+
+def test_round_trip(path):
+    reader = DatasetReader(path)
+    try:
+        assert reader.meta == dict(seed=42)
+        assert reader.count("rows") == len(ROWS)
+        assert list(reader.rows("rows")) == ROWS
+        # tables can be read again
+        assert list(reader.rows("rows")) == ROWS
+    finally:
+        reader.close()
+
+
+def test_close_after_failed_iteration(path):
+    reader = DatasetReader(path)
+
+    def insert():
+        rows = reader.rows("rows")
+        for _ in rows:
+            raise RuntimeError("db error")
+
+    # traceback keeps iterators over mmap alive, close must not hide error
+    with pytest.raises(RuntimeError, match="db error"):
+        try:
+            insert()
+        finally:
+            reader.close()
+
+
+def test_rows_after_close(path):
+    reader = DatasetReader(path)
+    rows = reader.rows("rows")
+    next(rows)
+
+    reader.close()
+
+    with pytest.raises(ValueError):
+        next(rows)
+
+
+def test_truncated(path):
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 1)
+
+    with pytest.raises(DatasetError):
+        DatasetReader(path)
+
+
+def test_invalid_file_is_closed(path, monkeypatch):
+    files = []
+
+    def open_(*args):
+        files.append(open(*args))
+
+        return files[-1]
+
+    monkeypatch.setattr(dataset, "open", open_, raising=False)
+
+    with open(path, "r+b") as f:
+        f.write(b"NOPE")
+
+    with pytest.raises(DatasetError):
+        DatasetReader(path)
+
+    assert files[0].closed